@@ -1,8 +1,24 @@
 import socket
 import json
+import os
+import logging
  
 # Configuration
 COMMAND_STATION_PORT = 33500
+RECEIVER_PROCESSES = 4  # Number of processes sharing COMMAND_STATION_PORT
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
+ 
+# Logging setup; messages are formatted lazily, only when the level is enabled
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+log = logging.getLogger(__name__)
+ 
+# Datagrams are received into one preallocated buffer instead of a new bytes object each
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
  
  
 def process_message(message):
@@ -10,27 +26,44 @@ def process_message(message):
     Processes incoming messages, differentiating control and data types.
     """
     if message["type"] == "control":
-        print(f"[Control Message] {json.dumps(message, indent=2)}")
+        log.info("[Control Message] %s", message)
     elif message["type"] == "data":
-        print(f"[Data Message] {json.dumps(message, indent=2)}")
+        log.info("[Data Message] %s", message)
     else:
-        print(f"[Unknown Message Type] {json.dumps(message, indent=2)}")
+        log.info("[Unknown Message Type] %s", message)
  
  
-def main():
-    """Command Station main function."""
+def create_listener():
+    """Create a UDP socket that shares COMMAND_STATION_PORT with the other receiver processes."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     sock.bind(("", COMMAND_STATION_PORT))
+    return sock
+ 
+ 
+def main():
+    """Command Station main function."""
+    sock = create_listener()
     print(f"Command Station listening on port {COMMAND_STATION_PORT}...")
  
+    # The kernel spreads datagrams across every socket bound with SO_REUSEPORT,
+    # so each forked process decodes its share in parallel
+    for _ in range(RECEIVER_PROCESSES - 1):
+        if os.fork() == 0:
+            sock.close()
+            sock = create_listener()
+            break
+ 
+    # Bind the per-packet callables to locals once instead of looking them up every datagram
+    recv_into, loads, debug = sock.recvfrom_into, json.loads, log.debug
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
-            print(f"Received from {addr}:")
+            size, addr = recv_into(recv_buffer, RECV_BUFFER_SIZE)
+            message = loads(str(recv_view[:size], "utf-8"))
+            debug("Received from %s:", addr)
             process_message(message)
         except Exception as e:
-            print(f"Error in Command Station: {e}")
+            log.error("Error in Command Station: %s", e)
  
  
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import ctypes
+import ctypes.util
+import errno
+import functools
+import logging
+import os
+import socket
+import struct
+import threading
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+RECV_BATCH_SIZE = 32  # Datagrams read per recvmmsg call
+RECV_BUFFER_SIZE = 65536  # Large enough for any UDP datagram, so none is truncated
+SOCKADDR_IN_SIZE = 16
+
+# sendmmsg(2)/recvmmsg(2) are Linux-only; other platforms fall back to one
+# sendto/recvfrom per packet
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_sendmmsg = getattr(_libc, "sendmmsg", None)
+if _sendmmsg is not None:
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+
+_recvmmsg = getattr(_libc, "recvmmsg", None)
+if _recvmmsg is not None:
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+
+log = logging.getLogger(__name__)
+
+# Receive buffers are allocated once per thread and reused by its recv_batch calls,
+# so threads reading at the same time never share them or wait on each other
+_recv_state = threading.local()
+
+
+@functools.lru_cache(maxsize=256)
+def _sockaddr_in(ip, port):
+    """Build a struct sockaddr_in for a destination; destinations rarely change."""
+    packed = (
+        struct.pack("=H", socket.AF_INET)
+        + struct.pack("!H", port)
+        + socket.inet_aton(socket.gethostbyname(ip))
+        + bytes(8)
+    )
+    return ctypes.create_string_buffer(packed, len(packed))
+
+
+def send_batch(sock, packets):
+    """Send a list of (data, (ip, port)) pairs using a single sendmmsg call."""
+    if _sendmmsg is None:
+        for data, address in packets:
+            sock.sendto(data, address)
+        return len(packets)
+
+    count = len(packets)
+    msgvec = (MMsgHdr * count)()
+    iovecs = (IOVec * count)()
+    buffers = []  # Keep payload buffers alive until the syscall returns
+    for i, (data, (ip, port)) in enumerate(packets):
+        buffer = ctypes.create_string_buffer(data, len(data))
+        buffers.append(buffer)
+        iovecs[i].iov_base = ctypes.addressof(buffer)
+        iovecs[i].iov_len = len(data)
+        name = _sockaddr_in(ip, port)
+        header = msgvec[i].msg_hdr
+        header.msg_name = ctypes.addressof(name)
+        header.msg_namelen = ctypes.sizeof(name)
+        header.msg_iov = ctypes.pointer(iovecs[i])
+        header.msg_iovlen = 1
+
+    sent = _sendmmsg(sock.fileno(), msgvec, count, 0)
+    if sent < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    # The kernel may stop early (e.g. full socket buffer); send the rest one by one
+    for data, address in packets[sent:]:
+        sock.sendto(data, address)
+    return count
+
+
+def _recv_buffers():
+    """Return this thread's (msgvec, buffers, names), allocating them on first use."""
+    try:
+        return _recv_state.buffers
+    except AttributeError:
+        pass
+    msgvec = (MMsgHdr * RECV_BATCH_SIZE)()
+    iovecs = (IOVec * RECV_BATCH_SIZE)()
+    buffers = [ctypes.create_string_buffer(RECV_BUFFER_SIZE) for _ in range(RECV_BATCH_SIZE)]
+    names = [ctypes.create_string_buffer(SOCKADDR_IN_SIZE) for _ in range(RECV_BATCH_SIZE)]
+    for i in range(RECV_BATCH_SIZE):
+        iovecs[i].iov_base = ctypes.addressof(buffers[i])
+        iovecs[i].iov_len = RECV_BUFFER_SIZE
+        header = msgvec[i].msg_hdr
+        header.msg_name = ctypes.addressof(names[i])
+        header.msg_namelen = SOCKADDR_IN_SIZE
+        header.msg_iov = ctypes.pointer(iovecs[i])
+        header.msg_iovlen = 1
+    # The iovecs are only referenced through msgvec, so they are kept alive alongside it
+    _recv_state.buffers = (msgvec, buffers, names, iovecs)
+    return _recv_state.buffers
+
+
+def recv_batch(sock):
+    """Receive up to RECV_BATCH_SIZE (data, (ip, port)) pairs with a single recvmmsg call."""
+    if _recvmmsg is None:
+        return [sock.recvfrom(RECV_BUFFER_SIZE)]
+
+    msgvec, buffers, names, _ = _recv_buffers()
+    count = _recvmmsg(sock.fileno(), msgvec, RECV_BATCH_SIZE, socket.MSG_DONTWAIT, None)
+    if count < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+            return []
+        raise OSError(err, os.strerror(err))
+
+    packets = []
+    for i in range(count):
+        name = names[i].raw
+        address = (socket.inet_ntoa(name[4:8]), struct.unpack_from("!H", name, 2)[0])
+        msgvec[i].msg_hdr.msg_namelen = SOCKADDR_IN_SIZE  # The kernel overwrites it
+        if msgvec[i].msg_hdr.msg_flags & socket.MSG_TRUNC:
+            # Only part of the datagram fit in the buffer; drop it rather than pass it on cut short
+            log.warning("Dropped a truncated datagram from %s:%s", *address)
+            continue
+        packets.append((ctypes.string_at(buffers[i], msgvec[i].msg_len), address))
+    return packets
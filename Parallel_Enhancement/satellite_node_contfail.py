@@ -38,7 +38,7 @@ NEIGHBORS = [
 # Track processed message IDs to prevent duplication
 recent_messages = {}
 message_queue = queue.PriorityQueue()
-connection_queue = queue.Queue()
+connection_queue = queue.SimpleQueue()  # Several workers consume, so keep it thread-safe but lightweight
  
  
 def is_duplicate(message_id):
@@ -167,7 +167,6 @@ def connection_worker(sock):
         try:
             addr, message = connection_queue.get()
             handle_connection(sock, addr, message)
-            connection_queue.task_done()
         except Exception as e:
             print(f"Error in connection worker: {e}")
  
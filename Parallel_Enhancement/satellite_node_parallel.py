@@ -3,7 +3,14 @@ import json
 import time
 import threading
 import sys
-import queue
+import os
+import functools
+import collections
+import heapq
+import itertools
+import selectors
+import logging
+from mmsg_util import recv_batch, send_batch
  
 # Configuration
 SATELLITE_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33001
@@ -12,7 +19,18 @@ COMMAND_STATION_IP = "10.35.70.19"  # Replace with actual Command Station IP
 COMMAND_STATION_PORT = 33500
 BROADCAST_INTERVAL = 5
 ACK_LISTEN_PORT = 33020  # Vehicle's designated ACK port
-MAX_CONNECTIONS = 5  # Maximum simultaneous connections
+MAX_CONNECTIONS = 5  # Number of receiver processes sharing SATELLITE_PORT
+DUPLICATE_WINDOW = 10  # Seconds a message ID is remembered
+MAX_RECENT_MESSAGES = 4096  # Bound on remembered message IDs
+ISL_DELAY = 0.5  # Simulated delay for inter-satellite links (in seconds)
+ 
+# Logging setup; per-packet messages are DEBUG so they cost a level check when disabled
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+log = logging.getLogger(__name__)
  
 # Routing Table and Neighbors
 ROUTING_TABLE = {
@@ -34,32 +52,76 @@ NEIGHBORS = [
     {"id": "sat_5", "ip": "127.0.0.1", "port": 33005}
 ]
  
-# Track processed message IDs to prevent duplication
-recent_messages = {}
-message_queue = queue.PriorityQueue()
-connection_queue = queue.Queue()
+# Flattened lookups for the forwarding path
+ROUTING_NEXT_HOP = {destination: entry["next_hop"] for destination, entry in ROUTING_TABLE.items()}
+NEIGHBORS_BY_ID = {neighbor["id"]: neighbor for neighbor in NEIGHBORS}
+ 
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+ 
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, b""]
+ 
+# Shared socket for forwards and ACKs, opened once instead of per send
+send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+ 
+# (data, address) pairs produced while handling one received batch; serve()
+# flushes them with a single sendmmsg call
+outbox = []
+ 
+# Neighbor forwards waiting out the simulated ISL delay, ordered by send time
+delayed_forwards = []
+delayed_forwards_ready = threading.Condition()
+delayed_forward_order = itertools.count()  # Tie-breaker so equal deadlines never compare messages
+ 
+# Track processed message IDs to prevent duplication. Each receiver process keeps its
+# own cache: SO_REUSEPORT hashes every flow to one process, so a vehicle's retransmissions
+# from the same socket are caught, but a copy of a message arriving from another source
+# address or port lands in whichever process its flow hashes to and is forwarded again
+recent_messages = collections.OrderedDict()
  
 def is_duplicate(message_id):
     """Check if a message ID has already been processed."""
     current_time = time.time()
+    # IDs are stored in arrival order, so expired entries are always at the front
+    while recent_messages:
+        oldest_id = next(iter(recent_messages))
+        if current_time - recent_messages[oldest_id] < DUPLICATE_WINDOW:
+            break
+        recent_messages.popitem(last=False)
     if message_id in recent_messages:
-        if current_time - recent_messages[message_id] < 10:  # 10 seconds threshold
-            return True
-        else:
-            del recent_messages[message_id]
+        return True
     recent_messages[message_id] = current_time
+    if len(recent_messages) > MAX_RECENT_MESSAGES:
+        recent_messages.popitem(last=False)  # Evict the oldest ID
     return False
  
+def encode_message(message):
+    """Serialize a message to compact UTF-8 JSON bytes."""
+    return json_encoder.encode(message).encode()
+ 
+@functools.lru_cache(maxsize=1024)
+def message_envelope(msg_type, source, destination):
+    """Pre-encode the fields that stay fixed for a sender/receiver pair."""
+    head = json_encoder.encode({"type": msg_type, "source": source, "destination": destination})
+    id_prefix = json_encoder.encode(f"{source}-")
+    return head[:-1].encode() + b',"payload":', id_prefix[:-1].encode()
+ 
+def current_timestamp():
+    """Return the UTC timestamp as bytes, formatting it at most once per second."""
+    now = int(time.time())
+    if now != timestamp_cache[0]:
+        timestamp_cache[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)).encode()]
+    return timestamp_cache[1]
+ 
+def message_tail(id_prefix):
+    """Encode the per-message timestamp and unique ID that close a message."""
+    return b',"timestamp":"%s","id":%s%d"}' % (current_timestamp(), id_prefix, time.time_ns())
+ 
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
-        "type": msg_type,
-        "source": source,
-        "destination": destination,
-        "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": f"{source}-{time.time_ns()}"  # Unique message ID
-    })
+    """Create a formatted message as wire-ready bytes."""
+    head, id_prefix = message_envelope(msg_type, source, destination)
+    return head + encode_message(payload) + message_tail(id_prefix)
  
 def broadcast_presence():
     """Broadcast satellite availability."""
@@ -67,124 +129,149 @@ def broadcast_presence():
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     broadcast_address = "255.255.255.255"
     interval = BROADCAST_INTERVAL
+    # Announcements only differ in their timestamp and ID, so build the rest once
+    head, id_prefix = message_envelope("announcement", f"satellite_{SATELLITE_PORT}", "all")
+    head += encode_message({"port": SATELLITE_PORT})
     while True:
         try:
-            message = create_message(
-                "announcement", f"satellite_{SATELLITE_PORT}", "all", {"port": SATELLITE_PORT}
-            )
-            sock.sendto(message.encode(), (broadcast_address, BROADCAST_PORT))
-            print(f"Satellite {SATELLITE_PORT} broadcasted: {message}")
+            message = head + message_tail(id_prefix)
+            sock.sendto(message, (broadcast_address, BROADCAST_PORT))
+            log.debug("Satellite %s broadcasted: %s", SATELLITE_PORT, message)
             # Dynamically adjust interval based on network stability
             interval = min(interval + 1, 30)  # Cap interval at 30 seconds
             time.sleep(interval)
         except Exception as e:
-            print(f"Error broadcasting presence: {e}")
+            log.error("Error broadcasting presence: %s", e)
  
 def forward_to_command_station(data):
-    """Forward data to the Command Station."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        sock.sendto(data.encode(), (COMMAND_STATION_IP, COMMAND_STATION_PORT))
-        print(f"Satellite {SATELLITE_PORT} forwarded data to Command Station.")
-    except Exception as e:
-        print(f"Error forwarding to Command Station: {e}")
-    finally:
-        sock.close()
+    """Queue data for the Command Station; it goes out with the rest of the batch."""
+    outbox.append((data, (COMMAND_STATION_IP, COMMAND_STATION_PORT)))
+    log.debug("Satellite %s forwarded data to Command Station.", SATELLITE_PORT)
  
 def forward_to_neighbor(message, neighbor):
-    """Forward data to a specific neighboring satellite."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    """Queue data for a neighboring satellite; it is sent after the simulated ISL delay."""
+    with delayed_forwards_ready:
+        heapq.heappush(delayed_forwards, (time.monotonic() + ISL_DELAY, next(delayed_forward_order), message, neighbor))
+        delayed_forwards_ready.notify()
+ 
+def delayed_forwarder():
+    """Send each queued neighbor forward once its ISL delay has elapsed."""
+    while True:
+        with delayed_forwards_ready:
+            while not delayed_forwards or delayed_forwards[0][0] > time.monotonic():
+                timeout = delayed_forwards[0][0] - time.monotonic() if delayed_forwards else None
+                delayed_forwards_ready.wait(timeout)
+            _, _, message, neighbor = heapq.heappop(delayed_forwards)
+        send_to_neighbor(message, neighbor)
+ 
+def send_to_neighbor(message, neighbor):
+    """Send data to a specific neighboring satellite."""
     try:
-        time.sleep(0.5)  # Simulate ISL delay
-        sock.sendto(message.encode(), (neighbor["ip"], neighbor["port"]))
-        print(f"Forwarded data to neighbor {neighbor['id']} at {neighbor['ip']}:{neighbor['port']}")
+        send_sock.sendto(message, (neighbor["ip"], neighbor["port"]))
+        log.debug("Forwarded data to neighbor %s at %s:%s", neighbor["id"], neighbor["ip"], neighbor["port"])
     except Exception as e:
-        print(f"Error forwarding to neighbor {neighbor['id']}: {e}")
-    finally:
-        sock.close()
- 
-def route_data(message, neighbors):
-    """Route data based on the routing table with priority handling."""
-    priority = message.get("priority", 1)  # Default priority is 1
-    message_queue.put((priority, message))
-    while not message_queue.empty():
-        _, msg = message_queue.get()
-        destination = msg["destination"]
-        if is_duplicate(msg["id"]):
-            continue
-        try:
-            if destination in ROUTING_TABLE:
-                next_hop = ROUTING_TABLE[destination]["next_hop"]
-                if next_hop == "command_station":
-                    forward_to_command_station(json.dumps(msg))
-                else:
-                    neighbor = next((n for n in neighbors if n["id"] == next_hop), None)
-                    if neighbor:
-                        forward_to_neighbor(json.dumps(msg), neighbor)
-                    else:
-                        raise ValueError(f"No route to destination {destination}")
+        log.error("Error forwarding to neighbor %s: %s", neighbor["id"], e)
+ 
+def route_data(message, data):
+    """Route data based on the routing table, forwarding the datagram exactly as received."""
+    destination = message["destination"]
+    if is_duplicate(message["id"]):
+        return
+    try:
+        next_hop = ROUTING_NEXT_HOP.get(destination)
+        if next_hop is not None:
+            if next_hop == "command_station":
+                forward_to_command_station(data)
             else:
-                raise KeyError(f"Destination {destination} not in routing table")
-        except Exception as e:
-            print(f"Error routing message: {e}")
+                neighbor = NEIGHBORS_BY_ID.get(next_hop)
+                if neighbor:
+                    forward_to_neighbor(data, neighbor)
+                else:
+                    raise ValueError(f"No route to destination {destination}")
+        else:
+            raise KeyError(f"Destination {destination} not in routing table")
+    except Exception as e:
+        log.error("Error routing message: %s", e)
  
 def respond_to_vehicle(addr, vehicle_id):
-    """Send acknowledgment to the vehicle."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    """Queue an acknowledgment for the vehicle; it goes out with the rest of the batch."""
     try:
         ack_message = create_message("ack", f"satellite_{SATELLITE_PORT}", vehicle_id, {"status": "received"})
         # Explicitly send the ACK to the vehicle's designated ACK_LISTEN_PORT
         vehicle_ip = addr[0]
-        sock.sendto(ack_message.encode(), (vehicle_ip, ACK_LISTEN_PORT))
-        print(f"Sent ACK to Vehicle {vehicle_id} at {vehicle_ip}:{ACK_LISTEN_PORT}")
+        outbox.append((ack_message, (vehicle_ip, ACK_LISTEN_PORT)))
+        log.debug("Sent ACK to Vehicle %s at %s:%s", vehicle_id, vehicle_ip, ACK_LISTEN_PORT)
     except Exception as e:
-        print(f"Error sending ACK to Vehicle: {e}")
-    finally:
-        sock.close()
+        log.error("Error sending ACK to Vehicle: %s", e)
  
-def handle_connection(sock, addr, message):
+def handle_connection(addr, message, data):
     """Handle an individual connection."""
     try:
         if message["type"] == "data":
-            route_data(message, NEIGHBORS)
+            route_data(message, data)
             respond_to_vehicle(addr, message["source"])
     except Exception as e:
-        print(f"Error handling connection: {e}")
+        log.error("Error handling connection: %s", e)
+ 
+def create_listener():
+    """Create a UDP socket that shares SATELLITE_PORT with the other receiver processes."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", SATELLITE_PORT))
+    return sock
  
-def connection_worker(sock):
-    """Worker thread to handle queued connections."""
+def serve(sock):
+    """Receive and handle datagrams inline from a single-threaded event loop."""
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    # Bind the per-packet callables to locals once instead of looking them up every datagram
+    select, loads, debug, handle = sel.select, json.loads, log.debug, handle_connection
     while True:
-        try:
-            addr, message = connection_queue.get()
-            handle_connection(sock, addr, message)
-            connection_queue.task_done()
-        except Exception as e:
-            print(f"Error in connection worker: {e}")
+        for key, _ in select():
+            # Drain a whole batch per wakeup, then go back to waiting
+            try:
+                packets = recv_batch(key.fileobj)
+            except Exception as e:
+                log.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+                continue
+            for data, addr in packets:
+                try:
+                    message = loads(data)
+                    debug("Satellite %s received data from %s: %s", SATELLITE_PORT, addr, message)
+                    handle(addr, message, data)
+                except Exception as e:
+                    log.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+            # Every forward and ACK for the batch leaves in one syscall
+            if outbox:
+                try:
+                    send_batch(send_sock, outbox)
+                except Exception as e:
+                    log.error("Error sending batch from Satellite %s: %s", SATELLITE_PORT, e)
+                outbox.clear()
  
 def main():
     """Main satellite node function."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        sock.bind(("", SATELLITE_PORT))
+        sock = create_listener()
         print(f"Satellite {SATELLITE_PORT} listening on port {SATELLITE_PORT}.")
     except OSError as e:
         print(f"Failed to bind to port {SATELLITE_PORT}: {e}")
         sys.exit(1)  # Exit if the port is already in use
  
-    # Start worker threads for handling connections
-    for _ in range(MAX_CONNECTIONS):
-        threading.Thread(target=connection_worker, args=(sock,), daemon=True).start()
+    # Fork receivers before starting any threads; the kernel spreads datagrams
+    # across every socket bound to the port with SO_REUSEPORT
+    for _ in range(MAX_CONNECTIONS - 1):
+        if os.fork() == 0:
+            sock.close()
+            sock = create_listener()
+            break
+    else:
+        # Only the parent process announces the satellite
+        threading.Thread(target=broadcast_presence, daemon=True).start()
  
-    threading.Thread(target=broadcast_presence, daemon=True).start()
+    threading.Thread(target=delayed_forwarder, daemon=True).start()
  
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
-            print(f"Satellite {SATELLITE_PORT} received data from {addr}: {message}")
-            connection_queue.put((addr, message))
-        except Exception as e:
-            print(f"Error on Satellite Node {SATELLITE_PORT}: {e}")
+    serve(sock)
  
 if __name__ == "__main__":
     main()
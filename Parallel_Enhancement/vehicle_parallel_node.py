@@ -3,6 +3,9 @@ import json
 import time
 import random
 import threading
+import functools
+import logging
+from mmsg_util import send_batch
 
 # Configuration
 BROADCAST_PORT = 34000
@@ -12,7 +15,15 @@ DATA_SEND_INTERVAL = 5  # Interval between data transmissions
 MAX_RETRIES = 3  # Maximum number of retries for sending data
 ACK_TIMEOUT = 2  # Timeout for waiting for an ACK
 SATELLITE_REDISCOVERY_INTERVAL = 60  # Periodic rediscovery of satellites
-MAX_PARALLEL_TRANSMISSIONS = 3  # Maximum number of concurrent transmissions
+RANDOM_BATCH_SIZE = 4096  # GPS fixes and vehicle IDs drawn per batch
+
+# Logging setup; per-packet messages are DEBUG so they cost a level check when disabled
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+log = logging.getLogger(__name__)
 
 # Metrics tracking
 metrics = {
@@ -22,20 +33,46 @@ metrics = {
     "total_retries": 0,
 }
 
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, b""]
+
+# Pre-drawn GPS fixes and vehicle IDs, refilled when exhausted
+gps_batch = iter(())
+vehicle_id_batch = iter(())
+
 # Thread-safe lock for metrics
 metrics_lock = threading.Lock()
 
 
+@functools.lru_cache(maxsize=1024)
+def message_envelope(msg_type, source, destination):
+    """Pre-encode the fields that stay fixed for a sender/receiver pair."""
+    head = json_encoder.encode({"type": msg_type, "source": source, "destination": destination})
+    id_prefix = json_encoder.encode("{}-".format(source))
+    return head[:-1].encode('utf-8') + b',"payload":', id_prefix[:-1].encode('utf-8')
+
+
+def current_timestamp():
+    """Return the UTC timestamp as bytes, formatting it at most once per second."""
+    now = int(time.time())
+    if now != timestamp_cache[0]:
+        timestamp_cache[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)).encode('utf-8')]
+    return timestamp_cache[1]
+
+
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
-        "type": msg_type,
-        "source": source,
-        "destination": destination,
-        "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": "{}-{}".format(source, int(time.time() * 1000000))  # Unique ID using microseconds
-    })
+    """Create a formatted message as wire-ready bytes."""
+    head, id_prefix = message_envelope(msg_type, source, destination)
+    return b'%s%s,"timestamp":"%s","id":%s%d"}' % (
+        head,
+        json_encoder.encode(payload).encode('utf-8'),
+        current_timestamp(),
+        id_prefix,
+        int(time.time() * 1000000)  # Unique ID using microseconds
+    )
 
 
 def discover_satellites():
@@ -50,58 +87,70 @@ def discover_satellites():
     while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
         try:
             data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode('utf-8'))
+            message = json.loads(data)
             if message["type"] == "announcement" and "port" in message["payload"]:
                 discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
                 print("Discovered Satellite {} on IP {} Port {}".format(message['source'], addr[0], message['payload']['port']))
         except socket.timeout:
-            print("No broadcasts received during this interval.")
+            log.debug("No broadcasts received during this interval.")
             continue
         except Exception as e:
-            print("Error during satellite discovery: {}".format(e))
+            log.error("Error during satellite discovery: %s", e)
     sock.close()
     return discovered
 
 
-def send_data(sock, satellite_ip, satellite_port, message):
-    """Send data to a satellite and wait for acknowledgment."""
-    for attempt in range(MAX_RETRIES):
+def wait_for_acks(sock, pending, vehicle_id):
+    """Collect ACKs for vehicle_id until every pending satellite has answered or the timeout expires."""
+    log.debug("Waiting for ACK on port %s...", ACK_LISTEN_PORT)
+    # Bind the per-ACK callables to locals once instead of looking them up every datagram
+    now, settimeout, recvfrom, loads, debug = time.time, sock.settimeout, sock.recvfrom, json.loads, log.debug
+    deadline = now() + ACK_TIMEOUT
+    while pending:
+        remaining = deadline - now()
+        if remaining <= 0:
+            break
         try:
-            sock.sendto(message.encode('utf-8'), (satellite_ip, satellite_port))
-            print("Sent data to {}:{}: {}".format(satellite_ip, satellite_port, message))
-
-            # Wait for acknowledgment
-            sock.settimeout(ACK_TIMEOUT)
-            print("Waiting for ACK on port {}...".format(ACK_LISTEN_PORT))
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(ack.decode('utf-8'))
-            print("Received ACK from {}: {}".format(addr, ack_message))
-
-            if ack_message["type"] == "ack" and ack_message["source"].startswith("satellite"):
-                print("ACK validated from Satellite {}.".format(ack_message['source']))
-                return True
+            settimeout(remaining)
+            ack, addr = recvfrom(1024)
+            ack_message = loads(ack)
+            debug("Received ACK from %s: %s", addr, ack_message)
+
+            # Each data packet uses a fresh vehicle ID, so late ACKs for an earlier
+            # packet are addressed elsewhere and must not count for this one
+            if (ack_message["type"] == "ack" and ack_message["destination"] == vehicle_id
+                    and ack_message["source"] in pending):
+                debug("ACK validated from Satellite %s.", ack_message["source"])
+                del pending[ack_message["source"]]
         except socket.timeout:
-            print("No ACK received from Satellite {}:{}, attempt {}/{}.".format(satellite_ip, satellite_port, attempt + 1, MAX_RETRIES))
-            with metrics_lock:
-                metrics["total_retries"] += 1
+            break
         except Exception as e:
-            print("Error during ACK handling: {}".format(e))
-
-    return False
+            log.error("Error during ACK handling: %s", e)
 
 
 def generate_gps_data():
-    """Generate random GPS data."""
-    latitude = random.uniform(-90, 90)
-    longitude = random.uniform(-180, 180)
-    print("Generated GPS data: Latitude={}, Longitude={}".format(latitude, longitude))
+    """Generate random GPS data, drawing coordinates in batches."""
+    global gps_batch
+    try:
+        latitude, longitude = next(gps_batch)
+    except StopIteration:
+        uniform = random.uniform
+        gps_batch = iter([(uniform(-90, 90), uniform(-180, 180)) for _ in range(RANDOM_BATCH_SIZE)])
+        latitude, longitude = next(gps_batch)
+    log.debug("Generated GPS data: Latitude=%s, Longitude=%s", latitude, longitude)
     return {"latitude": latitude, "longitude": longitude}
 
 
 def generate_vehicle_id():
-    """Generate a random vehicle ID."""
-    vehicle_id = "vehicle_{}".format(random.randint(1000, 9999))
-    print("Generated Vehicle ID: {}".format(vehicle_id))
+    """Generate a random vehicle ID, drawing IDs in batches."""
+    global vehicle_id_batch
+    try:
+        vehicle_id = next(vehicle_id_batch)
+    except StopIteration:
+        numbers = random.choices(range(1000, 10000), k=RANDOM_BATCH_SIZE)
+        vehicle_id_batch = iter(["vehicle_{}".format(number) for number in numbers])
+        vehicle_id = next(vehicle_id_batch)
+    log.debug("Generated Vehicle ID: %s", vehicle_id)
     return vehicle_id
 
 
@@ -109,41 +158,48 @@ def rediscover_satellites(satellites):
     """Periodically rediscover satellites."""
     while True:
         time.sleep(SATELLITE_REDISCOVERY_INTERVAL)
-        print("Rediscovering satellites...")
+        log.info("Rediscovering satellites...")
         try:
             new_satellites = discover_satellites()
             satellites.update(new_satellites)
-            print("Updated Satellite List: {}".format(satellites))
+            log.info("Updated Satellite List: %s", satellites)
         except Exception as e:
-            print("Error during satellite rediscovery: {}".format(e))
+            log.error("Error during satellite rediscovery: %s", e)
 
 
 def send_data_to_all(satellites, sock):
-    """Send data to all discovered satellites in parallel."""
+    """Send data to all discovered satellites with batched transmissions."""
     while True:
         vehicle_id = generate_vehicle_id()
         gps_data = generate_gps_data()
 
-        print("Generated new data - Vehicle ID: {}, GPS: {}".format(vehicle_id, gps_data))
+        log.debug("Generated new data - Vehicle ID: %s, GPS: %s", vehicle_id, gps_data)
         message = create_message("data", vehicle_id, "satellite", {"gps": gps_data})
 
-        threads = []
-        for satellite, details in satellites.items():
-            if len(threads) >= MAX_PARALLEL_TRANSMISSIONS:
-                for t in threads:
-                    t.join()  # Wait for active transmissions to complete
-                threads = []  # Clear the list
-
-            t = threading.Thread(
-                target=send_data, args=(sock, details["ip"], details["port"], message)
-            )
-            t.start()
-            threads.append(t)
+        # One sendmmsg call per attempt reaches every satellite still missing an ACK
+        pending = dict(satellites)
+        total = len(pending)
+        for attempt in range(MAX_RETRIES):
+            try:
+                send_batch(sock, [(message, (details["ip"], details["port"])) for details in pending.values()])
+                log.debug("Sent data to %d satellites: %s", len(pending), message)
+            except Exception as e:
+                log.error("Error sending data: %s", e)
+
+            wait_for_acks(sock, pending, vehicle_id)
+            if not pending:
+                break
+            for details in pending.values():
+                log.warning("No ACK received from Satellite %s:%s, attempt %d/%d.", details["ip"], details["port"], attempt + 1, MAX_RETRIES)
+            with metrics_lock:
+                metrics["total_retries"] += len(pending)
 
-        for t in threads:
-            t.join()  # Ensure all threads finish before proceeding
+        with metrics_lock:
+            metrics["total_transmissions"] += total
+            metrics["successful_transmissions"] += total - len(pending)
+            metrics["failed_transmissions"] += len(pending)
 
-        print("Waiting for {} seconds before sending the next data packet...".format(DATA_SEND_INTERVAL))
+        log.debug("Waiting for %s seconds before sending the next data packet...", DATA_SEND_INTERVAL)
         time.sleep(DATA_SEND_INTERVAL)
 
 
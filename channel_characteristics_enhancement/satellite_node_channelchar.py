@@ -4,7 +4,11 @@ import time
 import threading
 import sys
 import queue
+import collections
 import random
+import heapq
+import itertools
+import logging
  
 # Configuration
 SATELLITE_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33001
@@ -14,9 +18,22 @@ COMMAND_STATION_PORT = 33500
 BROADCAST_INTERVAL = 5
 ACK_LISTEN_PORT = 33020  # Vehicle's designated ACK port
 MAX_CONNECTIONS = 5  # Maximum simultaneous connections
+DUPLICATE_WINDOW = 10  # Seconds a message ID is remembered
+MAX_RECENT_MESSAGES = 4096  # Bound on remembered message IDs
+MAX_ACK_SOCKETS = 64  # Connected ACK sockets kept for recent vehicles
 ISL_DELAY = 0.2  # Simulated delay for inter-satellite links (in seconds)
 PACKET_LOSS_PROBABILITY = 0.1  # 10% packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes per second
+LOSS_BATCH_SIZE = 1024  # Packet-loss decisions drawn per batch
+RECV_BUFFER_SIZE = 65536  # Large enough for any UDP datagram, so none is truncated
+ 
+# Logging setup; per-packet messages are DEBUG so they cost a level check when disabled
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+log = logging.getLogger(__name__)
  
 # Metrics
 metrics = {
@@ -27,6 +44,13 @@ metrics = {
 }
 metrics_lock = threading.Lock()
  
+# Channel simulation state: pre-drawn packet-loss decisions and a token bucket
+# holding up to one second's worth of bandwidth
+loss_decisions = iter(())
+bandwidth_tokens = BANDWIDTH_LIMIT
+bandwidth_updated = time.monotonic()
+bandwidth_lock = threading.Lock()
+ 
 # Routing Table and Neighbors
 ROUTING_TABLE = {
     "command_station": {"next_hop": "command_station"},  # Direct to Command Station
@@ -47,42 +71,114 @@ NEIGHBORS = [
     {"id": "sat_5", "ip": "127.0.0.1", "port": 33005},
 ]
  
+# Flattened lookups for the forwarding path
+ROUTING_NEXT_HOP = {destination: entry["next_hop"] for destination, entry in ROUTING_TABLE.items()}
+NEIGHBORS_BY_ID = {neighbor["id"]: neighbor for neighbor in NEIGHBORS}
+ 
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+ 
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, ""]
+ 
+# Shared socket for neighbor forwards, opened once instead of per send
+send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+ 
+# The Command Station address never changes, so connect once and send() without
+# passing the destination on every forward
+command_station_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+command_station_sock.connect((COMMAND_STATION_IP, COMMAND_STATION_PORT))
+ 
+# Connected ACK sockets for recently seen vehicles, least recently used first
+ack_socks = collections.OrderedDict()
+ack_socks_lock = threading.Lock()  # Shared by the connection workers
+ 
+# Neighbor forwards waiting out the simulated ISL delay, ordered by send time
+delayed_forwards = []
+delayed_forwards_ready = threading.Condition()
+delayed_forward_order = itertools.count()  # Tie-breaker so equal deadlines never compare messages
+ 
 # Track processed message IDs to prevent duplication
-recent_messages = {}
-message_queue = queue.PriorityQueue()
-connection_queue = queue.Queue()
+recent_messages = collections.OrderedDict()
+recent_messages_lock = threading.Lock()  # Shared by the connection workers
+connection_queue = queue.SimpleQueue()  # Several workers consume, so keep it thread-safe but lightweight
  
 def is_duplicate(message_id):
     """Check if a message ID has already been processed."""
-    current_time = time.time()
-    if message_id in recent_messages:
-        if current_time - recent_messages[message_id] < 10:  # 10 seconds threshold
+    with recent_messages_lock:
+        current_time = time.time()
+        # IDs are stored in arrival order, so expired entries are always at the front
+        while recent_messages:
+            oldest_id = next(iter(recent_messages))
+            if current_time - recent_messages[oldest_id] < DUPLICATE_WINDOW:
+                break
+            recent_messages.popitem(last=False)
+        if message_id in recent_messages:
             return True
+        recent_messages[message_id] = current_time
+        if len(recent_messages) > MAX_RECENT_MESSAGES:
+            recent_messages.popitem(last=False)  # Evict the oldest ID
+        return False
+ 
+def vehicle_ack_sock(vehicle_ip):
+    """Return a socket connected to a vehicle's ACK port, reusing recently used ones."""
+    with ack_socks_lock:
+        sock = ack_socks.get(vehicle_ip)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect((vehicle_ip, ACK_LISTEN_PORT))
+            ack_socks[vehicle_ip] = sock
+            if len(ack_socks) > MAX_ACK_SOCKETS:
+                # Not closed explicitly: a worker may still be sending on it, and the
+                # socket closes itself once the last reference is dropped
+                ack_socks.popitem(last=False)
         else:
-            del recent_messages[message_id]
-    recent_messages[message_id] = current_time
-    return False
+            ack_socks.move_to_end(vehicle_ip)
+        return sock
+ 
+def encode_message(message):
+    """Serialize a message to compact UTF-8 JSON bytes."""
+    return json_encoder.encode(message).encode()
+ 
+def current_timestamp():
+    """Return the UTC timestamp string, formatting it at most once per second."""
+    now = int(time.time())
+    if now != timestamp_cache[0]:
+        timestamp_cache[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))]
+    return timestamp_cache[1]
  
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
+    """Create a formatted message as wire-ready bytes."""
+    return encode_message({
         "type": msg_type,
         "source": source,
         "destination": destination,
         "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "timestamp": current_timestamp(),
         "id": f"{source}-{time.time_ns()}"  # Unique message ID
     })
  
 def simulate_packet_loss():
-    """Simulate packet loss based on probability."""
-    return random.random() < PACKET_LOSS_PROBABILITY
+    """Simulate packet loss based on probability, drawing decisions in batches."""
+    global loss_decisions
+    try:
+        return next(loss_decisions)
+    except StopIteration:
+        loss_decisions = iter([random.random() < PACKET_LOSS_PROBABILITY for _ in range(LOSS_BATCH_SIZE)])
+        return next(loss_decisions)
  
 def simulate_bandwidth(data):
-    """Simulate bandwidth constraints."""
-    data_size = len(data.encode())  # Size in bytes
-    delay = data_size / BANDWIDTH_LIMIT  # Simulated delay based on bandwidth
-    time.sleep(delay)
+    """Simulate bandwidth constraints; only sleep once the token bucket runs dry."""
+    global bandwidth_tokens, bandwidth_updated
+    with bandwidth_lock:
+        now = time.monotonic()
+        # Refill for the time elapsed since the last packet, then spend this one's bytes
+        bandwidth_tokens = min(BANDWIDTH_LIMIT, bandwidth_tokens + (now - bandwidth_updated) * BANDWIDTH_LIMIT)
+        bandwidth_updated = now
+        bandwidth_tokens -= len(data)
+        delay = -bandwidth_tokens / BANDWIDTH_LIMIT if bandwidth_tokens < 0 else 0
+    if delay:
+        time.sleep(delay)
  
 def broadcast_presence():
     """Broadcast satellite availability."""
@@ -96,112 +192,119 @@ def broadcast_presence():
             )
             if not simulate_packet_loss():
                 simulate_bandwidth(message)
-                sock.sendto(message.encode(), (broadcast_address, BROADCAST_PORT))
-                print(f"Satellite {SATELLITE_PORT} broadcasted: {message}")
+                sock.sendto(message, (broadcast_address, BROADCAST_PORT))
+                log.debug("Satellite %s broadcasted: %s", SATELLITE_PORT, message)
             else:
                 with metrics_lock:
                     metrics["total_packets_dropped"] += 1
-                print(f"Packet dropped during broadcast: {message}")
+                log.debug("Packet dropped during broadcast: %s", message)
             time.sleep(BROADCAST_INTERVAL)
         except Exception as e:
-            print(f"Error broadcasting presence: {e}")
+            log.error("Error broadcasting presence: %s", e)
  
 def forward_to_command_station(data):
     """Forward data to the Command Station."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         simulate_bandwidth(data)
-        sock.sendto(data.encode(), (COMMAND_STATION_IP, COMMAND_STATION_PORT))
-        print(f"Satellite {SATELLITE_PORT} forwarded data to Command Station.")
+        command_station_sock.send(data)
+        log.debug("Satellite %s forwarded data to Command Station.", SATELLITE_PORT)
         with metrics_lock:
             metrics["total_packets_forwarded"] += 1
     except Exception as e:
-        print(f"Error forwarding to Command Station: {e}")
-    finally:
-        sock.close()
+        log.error("Error forwarding to Command Station: %s", e)
  
 def forward_to_neighbor(message, neighbor):
-    """Forward data to a specific neighboring satellite."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    """Queue data for a neighboring satellite; it is sent after the simulated ISL delay."""
+    with delayed_forwards_ready:
+        heapq.heappush(delayed_forwards, (time.monotonic() + ISL_DELAY, next(delayed_forward_order), message, neighbor))
+        delayed_forwards_ready.notify()
+ 
+def delayed_forwarder():
+    """Send each queued neighbor forward once its ISL delay has elapsed."""
+    while True:
+        with delayed_forwards_ready:
+            while not delayed_forwards or delayed_forwards[0][0] > time.monotonic():
+                timeout = delayed_forwards[0][0] - time.monotonic() if delayed_forwards else None
+                delayed_forwards_ready.wait(timeout)
+            _, _, message, neighbor = heapq.heappop(delayed_forwards)
+        send_to_neighbor(message, neighbor)
+ 
+def send_to_neighbor(message, neighbor):
+    """Send data to a specific neighboring satellite over the simulated channel."""
     try:
-        time.sleep(ISL_DELAY)
         if not simulate_packet_loss():
             simulate_bandwidth(message)
-            sock.sendto(message.encode(), (neighbor["ip"], neighbor["port"]))
-            print(f"Forwarded data to neighbor {neighbor['id']} at {neighbor['ip']}:{neighbor['port']}")
+            send_sock.sendto(message, (neighbor["ip"], neighbor["port"]))
+            log.debug("Forwarded data to neighbor %s at %s:%s", neighbor["id"], neighbor["ip"], neighbor["port"])
             with metrics_lock:
                 metrics["total_packets_forwarded"] += 1
         else:
             with metrics_lock:
                 metrics["total_packets_dropped"] += 1
-            print(f"Packet dropped during forwarding: {message}")
+            log.debug("Packet dropped during forwarding: %s", message)
     except Exception as e:
-        print(f"Error forwarding to neighbor {neighbor['id']}: {e}")
-    finally:
-        sock.close()
+        log.error("Error forwarding to neighbor %s: %s", neighbor["id"], e)
  
-def route_data(message, neighbors):
-    """Route data based on the routing table."""
-    priority = message.get("priority", 1)
-    message_queue.put((priority, message))
-    while not message_queue.empty():
-        _, msg = message_queue.get()
-        destination = msg["destination"]
+def route_data(message, data):
+    """Route data based on the routing table, forwarding the datagram exactly as received."""
+    destination = message["destination"]
  
-        if is_duplicate(msg["id"]):
-            continue
+    if is_duplicate(message["id"]):
+        return
  
-        try:
-            if destination in ROUTING_TABLE:
-                next_hop = ROUTING_TABLE[destination]["next_hop"]
-                if next_hop == "command_station":
-                    forward_to_command_station(json.dumps(msg))
-                else:
-                    neighbor = next((n for n in neighbors if n["id"] == next_hop), None)
-                    if neighbor:
-                        forward_to_neighbor(json.dumps(msg), neighbor)
-                    else:
-                        print(f"Error: No route to next hop {next_hop}.")
+    try:
+        next_hop = ROUTING_NEXT_HOP.get(destination)
+        if next_hop is not None:
+            if next_hop == "command_station":
+                forward_to_command_station(data)
             else:
-                print(f"Warning: No route for destination '{destination}'. Forwarding to command station.")
-                forward_to_command_station(json.dumps(msg))
-        except Exception as e:
-            print(f"Error routing message: {e}")
+                neighbor = NEIGHBORS_BY_ID.get(next_hop)
+                if neighbor:
+                    forward_to_neighbor(data, neighbor)
+                else:
+                    log.error("No route to next hop %s.", next_hop)
+        else:
+            log.warning("No route for destination '%s'. Forwarding to command station.", destination)
+            forward_to_command_station(data)
+    except Exception as e:
+        log.error("Error routing message: %s", e)
  
 def respond_to_vehicle(addr, vehicle_id):
     """Send acknowledgment to the vehicle."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         ack_message = create_message("ack", f"satellite_{SATELLITE_PORT}", vehicle_id, {"status": "received"})
         vehicle_ip = addr[0]
-        sock.sendto(ack_message.encode(), (vehicle_ip, ACK_LISTEN_PORT))
+        sock = vehicle_ack_sock(vehicle_ip)
+        try:
+            sock.send(ack_message)
+        except ConnectionRefusedError:
+            # A connected socket reports an earlier ACK's ICMP port-unreachable on its next
+            # send; that ACK is already lost, but this one has not been sent yet
+            sock.send(ack_message)
         with metrics_lock:
             metrics["total_acks_sent"] += 1
-        print(f"Sent ACK to Vehicle {vehicle_id} at {vehicle_ip}:{ACK_LISTEN_PORT}")
+        log.debug("Sent ACK to Vehicle %s at %s:%s", vehicle_id, vehicle_ip, ACK_LISTEN_PORT)
     except Exception as e:
-        print(f"Error sending ACK to Vehicle: {e}")
-    finally:
-        sock.close()
+        log.error("Error sending ACK to Vehicle: %s", e)
  
-def handle_connection(sock, addr, message):
+def handle_connection(sock, addr, message, data):
     """Handle an individual connection."""
     try:
         if message["type"] == "data":
-            print(f"Routing data: {message}")
-            route_data(message, NEIGHBORS)
+            log.debug("Routing data: %s", message)
+            route_data(message, data)
             respond_to_vehicle(addr, message["source"])
     except Exception as e:
-        print(f"Error handling connection: {e}")
+        log.error("Error handling connection: %s", e)
  
 def connection_worker(sock):
     """Worker thread to handle queued connections."""
     while True:
         try:
-            addr, message = connection_queue.get()
-            handle_connection(sock, addr, message)
-            connection_queue.task_done()
+            addr, message, data = connection_queue.get()
+            handle_connection(sock, addr, message, data)
         except Exception as e:
-            print(f"Error in connection worker: {e}")
+            log.error("Error in connection worker: %s", e)
  
 def display_metrics():
     """Display metrics periodically."""
@@ -224,16 +327,21 @@ def main():
         threading.Thread(target=connection_worker, args=(sock,), daemon=True).start()
  
     threading.Thread(target=broadcast_presence, daemon=True).start()
+    threading.Thread(target=delayed_forwarder, daemon=True).start()
     threading.Thread(target=display_metrics, daemon=True).start()
  
+    # Bind the per-packet callables to locals once instead of looking them up every datagram
+    # Workers forward the received bytes after this loop has moved on, so each datagram
+    # needs its own bytes object; recvfrom allocates exactly that
+    recvfrom, loads, debug, enqueue = sock.recvfrom, json.loads, log.debug, connection_queue.put
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
-            print(f"Satellite {SATELLITE_PORT} received data from {addr}: {message}")
-            connection_queue.put((addr, message))
+            data, addr = recvfrom(RECV_BUFFER_SIZE)
+            message = loads(data)
+            debug("Satellite %s received data from %s: %s", SATELLITE_PORT, addr, message)
+            enqueue((addr, message, data))
         except Exception as e:
-            print(f"Error on Satellite Node {SATELLITE_PORT}: {e}")
+            log.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
  
 if __name__ == "__main__":
     main()
@@ -3,6 +3,9 @@ import json
 import time
 import random
 import threading
+import array
+import selectors
+import logging
 
 # Configuration
 BROADCAST_PORT = 34000
@@ -11,9 +14,23 @@ SATELLITE_DISCOVERY_TIMEOUT = 10  # Timeout for satellite discovery
 DATA_SEND_INTERVAL = 5  # Interval between data transmissions
 MAX_RETRIES = 3  # Maximum number of retries for sending data
 ACK_TIMEOUT = 2  # Timeout for waiting for an ACK
-SATELLITE_REDISCOVERY_INTERVAL = 60  # Rediscovery interval for satellites
+RETRY_BACKOFF_BASE = 0.05  # First retry waits about this long (seconds)
+RETRY_BACKOFF_CAP = 0.4  # Upper bound on the wait between retries (seconds)
+SATELLITE_COOLDOWN = 30  # Skip a satellite for this long after it exhausts its retries (seconds)
+RECV_BUFFER_SIZE = 65536  # Reused receive buffers, large enough for any UDP datagram
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # Kernel send/receive queues, sized to ride out bursts
+SATELLITE_EXPIRY = 120  # Forget satellites not heard from for this long (seconds)
+RANDOM_BATCH_SIZE = 4096  # GPS fixes and vehicle IDs drawn per batch
 
-# Metrics tracking
+# Logging setup; per-packet messages are DEBUG so they cost a level check when disabled
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+log = logging.getLogger(__name__)
+
+# Metrics tracking; display_metrics fills this in from the per-thread counters
 metrics = {
     "total_messages_sent": 0,
     "successful_transmissions": 0,
@@ -21,151 +38,272 @@ metrics = {
     "failed_transmissions": 0,
 }
 
-# Thread-safe lock for metrics
+# Per-thread counters are arrays indexed by these slots; aggregate_metrics maps them back to names
+COUNTERS = tuple(metrics)
+TOTAL_MESSAGES_SENT, SUCCESSFUL_TRANSMISSIONS, RETRANSMISSIONS, FAILED_TRANSMISSIONS = range(len(COUNTERS))
+
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+# Datagrams are received into preallocated buffers instead of a new bytes object each
+discovery_buffer = bytearray(RECV_BUFFER_SIZE)
+discovery_view = memoryview(discovery_buffer)
+ack_buffer = bytearray(RECV_BUFFER_SIZE)
+ack_view = memoryview(ack_buffer)
+
+# Substrings every announcement/ACK contains; checking for them in the raw buffer
+# skips stray traffic without a full JSON parse
+ANNOUNCEMENT_MARKER = b'"announcement"'
+ACK_MARKER = b'"ack"'
+
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, ""]
+
+# Pre-drawn GPS fixes and vehicle IDs, refilled when exhausted
+gps_batch = iter(())
+vehicle_id_batch = iter(())
+
+# Guards registration of per-thread counters and the aggregated metrics
 metrics_lock = threading.Lock()
 
+# Each thread counts into its own array, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = array.array("Q", [0] * len(COUNTERS))
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
+
+def update_metric(slot, increment=1):
+    """Record a metric in the calling thread's counters."""
+    thread_counters()[slot] += increment
+
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
+    with metrics_lock:
+        for slot, key in enumerate(COUNTERS):
+            metrics[key] = sum(counters[slot] for counters in registered_counters)
+        return dict(metrics)
+
+def current_timestamp(now):
+    """Return the UTC timestamp string for now, formatting it at most once per second."""
+    second = int(now)
+    if second != timestamp_cache[0]:
+        timestamp_cache[:] = [second, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second))]
+    return timestamp_cache[1]
+
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
+    """Create a formatted message as wire-ready bytes."""
+    now = time.time()
+    return json_encoder.encode({
         "type": msg_type,
         "source": source,
         "destination": destination,
         "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": "{}-{}".format(source, int(time.time() * 1000000))  # Unique ID for the message using microseconds
-    })
+        "timestamp": current_timestamp(now),
+        "id": f"{source}-{int(now * 1000000)}"  # Unique ID for the message using microseconds
+    }).encode("utf-8")
+
+def enlarge_socket_buffers(sock):
+    """Grow the kernel queues so bursts are not dropped while the node is busy."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
 
-def discover_satellites():
-    """Discover satellites via broadcast."""
-    discovered = {}
+def open_discovery_socket():
+    """Open the broadcast socket that receives satellite announcements."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    # Every socket sharing the port gets its own copy of a broadcast, so several
+    # vehicle nodes on one host can listen for announcements at once
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    enlarge_socket_buffers(sock)
     sock.bind(("", BROADCAST_PORT))
-    sock.settimeout(1)  # Short timeout for each listen cycle
-    print("Listening for satellite broadcasts...")
+    sock.setblocking(False)
+    return sock
 
-    start_time = time.time()
-    while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data)
-            if message["type"] == "announcement" and "port" in message["payload"]:
-                discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
-                print("Discovered Satellite {} on IP {} Port {}".format(message["source"], addr[0], message["payload"]["port"]))
-        except socket.timeout:
+def receive_announcement(sock, satellites):
+    """Read one datagram from the discovery socket and record the satellite it announces."""
+    try:
+        size, addr = sock.recvfrom_into(discovery_buffer, RECV_BUFFER_SIZE)
+        if discovery_buffer.find(ANNOUNCEMENT_MARKER, 0, size) < 0:
+            return
+        message = json.loads(str(discovery_view[:size], "utf-8"))
+        if message["type"] == "announcement" and "port" in message["payload"]:
+            source, port = message["source"], message["payload"]["port"]
+            if source not in satellites:
+                log.info("Discovered Satellite %s on IP %s Port %s", source, addr[0], port)
+            satellites[source] = {"ip": addr[0], "port": port, "last_seen": time.time()}
+    except Exception as e:
+        log.error("Error during satellite discovery: %s", e)
+
+def listen_for_announcements(selector, sock, satellites, duration):
+    """Record announcements as they arrive for duration seconds, then forget silent satellites."""
+    deadline = time.time() + duration
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        if selector.select(remaining):
+            receive_announcement(sock, satellites)
+
+    cutoff = time.time() - SATELLITE_EXPIRY
+    for satellite in [name for name, details in satellites.items() if details["last_seen"] < cutoff]:
+        log.warning("Satellite %s has not announced itself for %d seconds, removing it.", satellite, SATELLITE_EXPIRY)
+        del satellites[satellite]
+
+def retry_backoff(attempt):
+    """Return a capped, jittered delay before the retry that follows attempt."""
+    return min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * (1 << attempt)) * (0.5 + random.random())
+
+def wait_for_ack(sock, selector, vehicle_id, timeout):
+    """Read ACKs until one addressed to vehicle_id arrives; return False once timeout expires."""
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0 or not selector.select(remaining):
+            return False
+        size, addr = sock.recvfrom_into(ack_buffer, RECV_BUFFER_SIZE)
+        if ack_buffer.find(ACK_MARKER, 0, size) < 0:
             continue
-        except Exception as e:
-            print("Error during satellite discovery: {}".format(e))
-    sock.close()
-    return discovered
+        ack_message = json.loads(str(ack_view[:size], "utf-8"))
+        log.debug("Received ACK from %s: %s", addr, ack_message)
+
+        # Each data packet uses a fresh vehicle ID, so late ACKs for an earlier packet are
+        # addressed elsewhere; they are discarded and the wait goes on
+        if (ack_message["type"] == "ack" and ack_message["destination"] == vehicle_id
+                and ack_message["source"].startswith("satellite")):
+            log.debug("ACK validated from Satellite %s.", ack_message["source"])
+            return True
 
-def send_data(sock, satellite_ip, satellite_port, message):
+def send_data(sock, selector, satellite_ip, satellite_port, message, vehicle_id):
     """Send data to a satellite and wait for acknowledgment."""
     for attempt in range(MAX_RETRIES):
         try:
             sock.sendto(message, (satellite_ip, satellite_port))
-            print("Sent data to {}: {}: {}".format(satellite_ip, satellite_port, message))
-            with metrics_lock:
-                metrics["total_messages_sent"] += 1
+            log.debug("Sent data to %s: %s: %s", satellite_ip, satellite_port, message)
+            update_metric(TOTAL_MESSAGES_SENT)
 
             # Wait for acknowledgment
-            sock.settimeout(ACK_TIMEOUT)
-            print("Waiting for ACK on port {}...".format(ACK_LISTEN_PORT))
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(ack)
-            print("Received ACK from {}: {}".format(addr, ack_message))
-
-            if ack_message["type"] == "ack" and ack_message["source"].startswith("satellite"):
-                print("ACK validated from Satellite {}.".format(ack_message["source"]))
-                with metrics_lock:
-                    metrics["successful_transmissions"] += 1
-                return True
+            log.debug("Waiting for ACK on port %s...", ACK_LISTEN_PORT)
+            if not wait_for_ack(sock, selector, vehicle_id, ACK_TIMEOUT):
+                raise socket.timeout("timed out waiting for ACK")
+            update_metric(SUCCESSFUL_TRANSMISSIONS)
+            return True
         except socket.timeout:
-            print("No ACK received from Satellite {}:{}, attempt {}/{}.".format(satellite_ip, satellite_port, attempt + 1, MAX_RETRIES))
-            with metrics_lock:
-                metrics["retransmissions"] += 1
-            time.sleep(2 ** attempt)  # Exponential backoff
+            log.warning("No ACK received from Satellite %s:%s, attempt %d/%d.", satellite_ip, satellite_port, attempt + 1, MAX_RETRIES)
+            # Short jittered backoff, spent waiting for a late ACK; the packet is only
+            # sent again if none arrives
+            if wait_for_ack(sock, selector, vehicle_id, retry_backoff(attempt)):
+                update_metric(SUCCESSFUL_TRANSMISSIONS)
+                return True
+            update_metric(RETRANSMISSIONS)
         except Exception as e:
-            print("Error during ACK handling: {}".format(e))
+            log.error("Error during ACK handling: %s", e)
 
-    with metrics_lock:
-        metrics["failed_transmissions"] += 1
+    update_metric(FAILED_TRANSMISSIONS)
     return False
 
 def generate_gps_data():
-    """Generate random GPS data."""
-    latitude = random.uniform(-90, 90)
-    longitude = random.uniform(-180, 180)
-    print("Generated GPS data: Latitude={}, Longitude={}".format(latitude, longitude))
+    """Generate random GPS data, drawing coordinates in batches."""
+    global gps_batch
+    try:
+        latitude, longitude = next(gps_batch)
+    except StopIteration:
+        uniform = random.uniform
+        gps_batch = iter([(uniform(-90, 90), uniform(-180, 180)) for _ in range(RANDOM_BATCH_SIZE)])
+        latitude, longitude = next(gps_batch)
+    log.debug("Generated GPS data: Latitude=%s, Longitude=%s", latitude, longitude)
     return {"latitude": latitude, "longitude": longitude}
 
 def generate_vehicle_id():
-    """Generate a random vehicle ID."""
-    vehicle_id = "vehicle_{}".format(random.randint(1000, 9999))
-    print("Generated Vehicle ID: {}".format(vehicle_id))
+    """Generate a random vehicle ID, drawing IDs in batches."""
+    global vehicle_id_batch
+    try:
+        vehicle_id = next(vehicle_id_batch)
+    except StopIteration:
+        numbers = random.choices(range(1000, 10000), k=RANDOM_BATCH_SIZE)
+        vehicle_id_batch = iter(["vehicle_{}".format(number) for number in numbers])
+        vehicle_id = next(vehicle_id_batch)
+    log.debug("Generated Vehicle ID: %s", vehicle_id)
     return vehicle_id
 
-def rediscover_satellites(satellites):
-    """Periodically rediscover satellites."""
-    while True:
-        time.sleep(SATELLITE_REDISCOVERY_INTERVAL)
-        print("Rediscovering satellites...")
-        new_satellites = discover_satellites()
-        satellites.update(new_satellites)
-        print("Updated Satellite List: {}".format(satellites))
-
 def display_metrics():
     """Display metrics periodically."""
     while True:
         time.sleep(30)
-        with metrics_lock:
-            print("Metrics: {}".format(metrics))
+        print("Metrics: {}".format(aggregate_metrics()))
 
 def main():
     """Main vehicle node function."""
-    satellites = discover_satellites()
+    # The discovery socket stays open: announcements keep the satellite list current
+    # while the node waits between transmissions, so no rediscovery pass is needed
+    discovery_sock = open_discovery_socket()
+    discovery_selector = selectors.DefaultSelector()
+    discovery_selector.register(discovery_sock, selectors.EVENT_READ)
+    print("Listening for satellite broadcasts...")
+
+    satellites = {}
+    listen_for_announcements(discovery_selector, discovery_sock, satellites, SATELLITE_DISCOVERY_TIMEOUT)
 
     if not satellites:
         print("No satellites discovered. Exiting...")
+        discovery_selector.close()
+        discovery_sock.close()
         return
 
-    # Start a background thread for periodic rediscovery
-    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(satellites,))
-    rediscovery_thread.setDaemon(True)
-    rediscovery_thread.start()
-
     # Start a thread for displaying metrics
     metrics_thread = threading.Thread(target=display_metrics)
     metrics_thread.setDaemon(True)
     metrics_thread.start()
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    enlarge_socket_buffers(sock)
     sock.bind(("", ACK_LISTEN_PORT))
+    sock.setblocking(False)
+    # One selector registration serves every ACK wait; no per-attempt settimeout
+    ack_selector = selectors.DefaultSelector()
+    ack_selector.register(sock, selectors.EVENT_READ)
     print("Listening for ACKs on port {}.".format(ACK_LISTEN_PORT))
+    cooldowns = {}  # Satellite name -> time until which it is skipped
 
     try:
         while True:
             vehicle_id = generate_vehicle_id()
             gps_data = generate_gps_data()
 
-            print("Generated new data - Vehicle ID: {}, GPS: {}".format(vehicle_id, gps_data))
+            log.debug("Generated new data - Vehicle ID: %s, GPS: %s", vehicle_id, gps_data)
 
             message = create_message("data", vehicle_id, "satellite", {"gps": gps_data})
 
-            for satellite, details in satellites.items():
-                print("Attempting to send data to Satellite {} at {}:{}".format(satellite, details["ip"], details["port"]))
-                success = send_data(sock, details["ip"], details["port"], message)
+            # Satellites that recently exhausted their retries are skipped while they cool
+            # down, unless every satellite is cooling down
+            now = time.time()
+            candidates = [(satellite, details) for satellite, details in satellites.items()
+                          if cooldowns.get(satellite, 0) <= now] or list(satellites.items())
+            for satellite, details in candidates:
+                log.debug("Attempting to send data to Satellite %s at %s:%s", satellite, details["ip"], details["port"])
+                success = send_data(sock, ack_selector, details["ip"], details["port"], message, vehicle_id)
 
                 if success:
-                    print("Data successfully transmitted and acknowledged by Satellite {}.".format(satellite))
+                    log.debug("Data successfully transmitted and acknowledged by Satellite %s.", satellite)
                     break
                 else:
-                    print("Failed to send data to Satellite {} after {} retries.".format(satellite, MAX_RETRIES))
+                    log.warning("Failed to send data to Satellite %s after %d retries.", satellite, MAX_RETRIES)
+                    cooldowns[satellite] = time.time() + SATELLITE_COOLDOWN
 
-            print("Waiting for {} seconds before sending the next data packet...".format(DATA_SEND_INTERVAL))
-            time.sleep(DATA_SEND_INTERVAL)
+            log.debug("Waiting for %s seconds before sending the next data packet...", DATA_SEND_INTERVAL)
+            listen_for_announcements(discovery_selector, discovery_sock, satellites, DATA_SEND_INTERVAL)
     finally:
+        ack_selector.close()
         sock.close()
+        discovery_selector.close()
+        discovery_sock.close()
 
 if __name__ == "__main__":
     random.seed()
@@ -1,7 +1,11 @@
 import socket
 import json
 import logging
+import logging.handlers
+import atexit
+import queue
 import threading
+import array
 import time
 import sys
 from encryption_util import decrypt_message
@@ -9,40 +13,97 @@ from encryption_util import decrypt_message
 # Configuration
 COMMAND_STATION_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33500
 METRICS_UPDATE_INTERVAL = 30  # Interval for displaying metrics
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
  
-# Metrics tracking
+# Metrics tracking; display_metrics fills this in from the per-thread counters
 metrics = {
     "total_messages_received": 0,
     "control_messages_received": 0,
     "data_messages_received": 0,
     "unknown_messages_received": 0,
     "malformed_messages_received": 0,
+    "total_processing_time": 0,
     "average_processing_time": 0,
     "sources": {},
 }
-metrics_lock = threading.Lock()
+metrics_lock = threading.Lock()  # Guards counter registration and the aggregated metrics
  
-# Logging Configuration
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO,
-    datefmt="%Y-%m-%d %H:%M:%S"
+# Datagrams are received into one preallocated buffer instead of a new bytes object each;
+# recvfrom(1024) silently truncated anything longer
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
+ 
+# Per-thread counters are arrays indexed by these slots; aggregate_metrics maps them back to names.
+# Processing time is counted in whole microseconds so every slot fits an unsigned 64-bit integer.
+COUNTERS = (
+    "total_messages_received",
+    "control_messages_received",
+    "data_messages_received",
+    "unknown_messages_received",
+    "malformed_messages_received",
+    "total_processing_time",
 )
+(TOTAL_MESSAGES_RECEIVED, CONTROL_MESSAGES_RECEIVED, DATA_MESSAGES_RECEIVED, UNKNOWN_MESSAGES_RECEIVED,
+ MALFORMED_MESSAGES_RECEIVED, TOTAL_PROCESSING_TIME_US) = range(len(COUNTERS))
+ 
+# Each thread counts into its own array and per-source dict, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+registered_sources = []
+ 
+# Logging Configuration; records go through a queue and a listener thread writes them,
+# so the receive loop never waits on console I/O
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+logging.root.setLevel(logging.INFO)
+ 
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = array.array("Q", [0] * len(COUNTERS))
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
+ 
+def thread_sources():
+    """Return the calling thread's per-source message counts, registering them on first use."""
+    sources = getattr(thread_metrics, "sources", None)
+    if sources is None:
+        sources = thread_metrics.sources = {}
+        with metrics_lock:
+            registered_sources.append(sources)
+    return sources
  
-def update_metric(key, increment=1):
-    """Thread-safe metric update."""
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
     with metrics_lock:
-        if key in metrics:
-            metrics[key] += increment
+        sources = {}
+        for thread_source_counts in registered_sources:
+            # list() copies in one step, so a concurrent insert cannot break the loop
+            for source, count in list(thread_source_counts.items()):
+                sources[source] = sources.get(source, 0) + count
+        for slot, key in enumerate(COUNTERS):
+            metrics[key] = sum(counters[slot] for counters in registered_counters)
+        metrics["total_processing_time"] /= 1000000
+        metrics["sources"] = sources
+        if metrics["total_messages_received"]:
+            metrics["average_processing_time"] = (
+                metrics["total_processing_time"] / metrics["total_messages_received"]
+            )
+        return dict(metrics)
  
-def log_message(level, message):
-    """Centralized logging function."""
+def log_message(level, message, *args):
+    """Centralized logging function; args are only formatted if the record is emitted."""
     log_function = {
         "info": logging.info,
         "warning": logging.warning,
         "error": logging.error,
     }.get(level.lower(), logging.info)
-    log_function(message)
+    log_function(message, *args)
  
 def process_message(encrypted_message, addr):
     """Processes incoming encrypted messages."""
@@ -51,58 +112,57 @@ def process_message(encrypted_message, addr):
         message = json.loads(decrypt_message(encrypted_message))
         source = message.get("source", "unknown")
         message_type = message.get("type", "unknown")
-        with metrics_lock:
-            if source not in metrics["sources"]:
-                metrics["sources"][source] = 0
-            metrics["sources"][source] += 1
+        sources = thread_sources()
+        sources[source] = sources.get(source, 0) + 1
  
         # Process message
         if message_type == "control":
-            log_message("info", f"[Control Message from {addr}] {json.dumps(message, indent=2)}")
-            update_metric("control_messages_received")
+            log_message("info", "[Control Message from %s] %s", addr, message)
+            slot = CONTROL_MESSAGES_RECEIVED
         elif message_type == "data":
-            log_message("info", f"[Data Message from {addr}] {json.dumps(message, indent=2)}")
-            update_metric("data_messages_received")
+            log_message("info", "[Data Message from %s] %s", addr, message)
+            slot = DATA_MESSAGES_RECEIVED
         else:
-            log_message("warning", f"[Unknown Message from {addr}] {json.dumps(message, indent=2)}")
-            update_metric("unknown_messages_received")
+            log_message("warning", "[Unknown Message from %s] %s", addr, message)
+            slot = UNKNOWN_MESSAGES_RECEIVED
  
     except Exception as e:
-        log_message("error", f"Error processing message: {e}")
-        update_metric("malformed_messages_received")
-    finally:
-        with metrics_lock:
-            processing_time = time.time() - start_time
-            metrics["total_messages_received"] += 1
-            metrics["average_processing_time"] = (
-                (metrics["average_processing_time"] + processing_time) / 2
-            )
+        log_message("error", "Error processing message: %s", e)
+        slot = MALFORMED_MESSAGES_RECEIVED
+ 
+    # All of this message's counts go to the thread's counters in one place
+    counters = thread_counters()
+    counters[slot] += 1
+    counters[TOTAL_MESSAGES_RECEIVED] += 1
+    counters[TOTAL_PROCESSING_TIME_US] += int((time.time() - start_time) * 1000000)
  
 def display_metrics():
     """Periodically display metrics."""
     while True:
         time.sleep(METRICS_UPDATE_INTERVAL)
-        with metrics_lock:
-            logging.info(f"Metrics: {json.dumps(metrics, indent=2)}")
+        logging.info("Metrics: %s", json.dumps(aggregate_metrics(), indent=2))
  
 def main():
     """Main function for the Command Station."""
+    log_listener.start()
+    atexit.register(log_listener.stop)  # Flush queued records on exit
+ 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         sock.bind(("", COMMAND_STATION_PORT))
-        log_message("info", f"Command Station listening on port {COMMAND_STATION_PORT}...")
+        log_message("info", "Command Station listening on port %s...", COMMAND_STATION_PORT)
     except OSError as e:
-        log_message("error", f"Failed to bind to port {COMMAND_STATION_PORT}: {e}")
+        log_message("error", "Failed to bind to port %s: %s", COMMAND_STATION_PORT, e)
         return
  
     threading.Thread(target=display_metrics, daemon=True).start()
  
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            process_message(data.decode(), addr)
+            size, addr = sock.recvfrom_into(recv_buffer, RECV_BUFFER_SIZE)
+            process_message(recv_view[:size], addr)  # base64 decoding accepts the buffer directly
         except Exception as e:
-            log_message("error", f"Error receiving data: {e}")
+            log_message("error", "Error receiving data: %s", e)
  
 if __name__ == "__main__":
     main()
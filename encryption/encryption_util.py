@@ -1,38 +1,33 @@
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.padding import PKCS7
-from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import os
 import base64
  
 # Hardcoded encryption key (shared across all nodes, ensure 32 bytes for AES-256)
 HARD_CODED_KEY = b"52eb0370b712e93c8bc1771579b1cbe7"  # Replace with your secure 32-byte key
+NONCE_SIZE = 12  # Standard GCM nonce length
+ 
+# One AEAD instance for the fixed key; each message is a single one-shot OpenSSL call.
+# Its methods and the base64 codecs are bound once instead of looked up per message.
+aead = AESGCM(HARD_CODED_KEY)
+aead_encrypt, aead_decrypt = aead.encrypt, aead.decrypt
+b64encode, b64decode, urandom = base64.b64encode, base64.b64decode, os.urandom
  
 def encrypt_message(plain_text):
     """
-    Encrypts a plain text message using AES-256 in CBC mode.
+    Encrypts a plain text message using AES-256 in GCM mode.
     """
-    iv = os.urandom(16)  # Generate a random IV
-    cipher = Cipher(algorithms.AES(HARD_CODED_KEY), modes.CBC(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
-    padder = PKCS7(algorithms.AES.block_size).padder()
- 
-    padded_data = padder.update(plain_text.encode()) + padder.finalize()
-    encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
+    nonce = urandom(NONCE_SIZE)  # Generate a random nonce
  
-    # Concatenate IV with encrypted data and encode in base64
-    return base64.b64encode(iv + encrypted_data).decode()
+    # Concatenate nonce with ciphertext and tag and encode in base64
+    return b64encode(nonce + aead_encrypt(nonce, plain_text.encode(), None)).decode()
  
 def decrypt_message(encrypted_text):
     """
-    Decrypts a base64 encoded encrypted message using AES-256 in CBC mode.
+    Decrypts a base64 encoded encrypted message using AES-256 in GCM mode.
+    Accepts the received bytes directly, so callers need not decode them first.
     """
-    encrypted_data = base64.b64decode(encrypted_text)
-    iv = encrypted_data[:16]  # Extract the IV
-    cipher = Cipher(algorithms.AES(HARD_CODED_KEY), modes.CBC(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
-    unpadder = PKCS7(algorithms.AES.block_size).unpadder()
- 
-    decrypted_padded_data = decryptor.update(encrypted_data[16:]) + decryptor.finalize()
-    decrypted_data = unpadder.update(decrypted_padded_data) + unpadder.finalize()
+    encrypted_data = b64decode(encrypted_text)
+    nonce = encrypted_data[:NONCE_SIZE]  # Extract the nonce
  
-    return decrypted_data.decode()
+    # Raises InvalidTag if the message was altered or encrypted with another key
+    return aead_decrypt(nonce, encrypted_data[NONCE_SIZE:], None).decode()
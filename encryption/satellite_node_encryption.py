@@ -20,6 +20,7 @@ ISL_DELAY = 0.2  # Inter-Satellite Link delay (seconds)
 PACKET_LOSS_PROBABILITY = 0.1  # Simulated 10% chance of packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes/second
 MAX_RETRIES = 3  # Max retries for packet forwarding
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
  
 # Metrics
 metrics = {
@@ -33,6 +34,10 @@ metrics = {
 }
 metrics_lock = threading.Lock()
  
+# Datagrams are received into one preallocated buffer; recvfrom(1024) silently truncated anything longer
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
+ 
 # Logging Configuration
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -186,7 +191,7 @@ def handle_connection(sock, addr, data):
     """Handle an individual connection."""
     try:
         start_time = time.time()
-        decrypted_message = json.loads(decrypt_message(data.decode()))
+        decrypted_message = json.loads(decrypt_message(data))
         logging.info(f"Handling message: {decrypted_message}")
         if is_duplicate(decrypted_message["id"]):
             logging.warning(f"Duplicate message detected: {decrypted_message['id']}")
@@ -230,9 +235,10 @@ def main():
     threading.Thread(target=display_metrics, daemon=True).start()
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
+            size, addr = sock.recvfrom_into(recv_buffer, RECV_BUFFER_SIZE)
             logging.info(f"Received encrypted data from {addr}")
-            connection_queue.put((addr, data))
+            # Copy the datagram out of the shared buffer before a worker picks it up
+            connection_queue.put((addr, bytes(recv_view[:size])))
         except Exception as e:
             logging.error(f"Error on Satellite Node {SATELLITE_PORT}: {e}")
  
@@ -18,6 +18,7 @@ ACK_TIMEOUT = 2
 SATELLITE_REDISCOVERY_INTERVAL = 60
 PACKET_LOSS_PROBABILITY = 0.05  # Reduced for debugging
 BANDWIDTH_LIMIT = 5000
+RECV_BUFFER_SIZE = 65536  # Reused receive buffers, large enough for any UDP datagram
  
 # Metrics tracking
 metrics = {
@@ -32,6 +33,13 @@ metrics = {
 # Thread-safe lock for metrics
 metrics_lock = threading.Lock()
  
+# Datagrams are received into preallocated buffers instead of a new bytes object each;
+# discovery and ACKs get separate buffers because rediscovery runs on its own thread
+discovery_buffer = bytearray(RECV_BUFFER_SIZE)
+discovery_view = memoryview(discovery_buffer)
+ack_buffer = bytearray(RECV_BUFFER_SIZE)
+ack_view = memoryview(ack_buffer)
+ 
 # Shutdown flag
 shutdown_flag = threading.Event()
  
@@ -90,8 +98,8 @@ def discover_satellites():
  
     while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
         try:
-            data, addr = sock.recvfrom(1024)
-            decrypted_message = json.loads(decrypt_message(data.decode()))
+            size, addr = sock.recvfrom_into(discovery_buffer, RECV_BUFFER_SIZE)
+            decrypted_message = json.loads(decrypt_message(discovery_view[:size]))
             if decrypted_message.get("type") == "announcement" and "port" in decrypted_message["payload"]:
                 discovered[decrypted_message["source"]] = {
                     "ip": addr[0],
@@ -135,8 +143,8 @@ def send_encrypted_data(sock, satellite_ip, satellite_port, message):
                 metrics["total_messages_sent"] += 1
  
             sock.settimeout(ACK_TIMEOUT)
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(decrypt_message(ack.decode()))
+            size, addr = sock.recvfrom_into(ack_buffer, RECV_BUFFER_SIZE)
+            ack_message = json.loads(decrypt_message(ack_view[:size]))
  
             if ack_message.get("type") == "ack":
                 response_time = time.time() - start_time
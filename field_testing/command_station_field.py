@@ -7,6 +7,7 @@ import time
 # Configuration
 COMMAND_STATION_PORT = 33500
 METRICS_UPDATE_INTERVAL = 30  # Interval for displaying metrics
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
  
 # Metrics tracking
 metrics = {
@@ -14,11 +15,17 @@ metrics = {
     "control_messages_received": 0,
     "data_messages_received": 0,
     "unknown_messages_received": 0,
+    "total_processing_time": 0,
     "average_processing_time": 0,
 }
  
 metrics_lock = threading.Lock()
  
+# Datagrams are received into one preallocated buffer instead of a new bytes object each;
+# recvfrom(1024) silently truncated anything longer
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
+ 
 # Logging Configuration
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -33,29 +40,29 @@ def process_message(message):
     Updates metrics accordingly.
     """
     start_time = time.time()
+    counter = None
     try:
         if message["type"] == "control":
             logging.info(f"[Control Message] {json.dumps(message, indent=2)}")
-            with metrics_lock:
-                metrics["control_messages_received"] += 1
+            counter = "control_messages_received"
         elif message["type"] == "data":
             logging.info(f"[Data Message] {json.dumps(message, indent=2)}")
-            with metrics_lock:
-                metrics["data_messages_received"] += 1
+            counter = "data_messages_received"
         else:
             logging.warning(f"[Unknown Message Type] {json.dumps(message, indent=2)}")
-            with metrics_lock:
-                metrics["unknown_messages_received"] += 1
+            counter = "unknown_messages_received"
     except Exception as e:
         logging.error(f"Error processing message: {e}")
     finally:
         processing_time = time.time() - start_time
+        # One lock acquisition records every metric for this message
         with metrics_lock:
+            if counter:
+                metrics[counter] += 1
             metrics["total_messages_received"] += 1
+            metrics["total_processing_time"] += processing_time
             metrics["average_processing_time"] = (
-                (metrics["average_processing_time"] + processing_time) / 2
-                if metrics["total_messages_received"] > 1
-                else processing_time
+                metrics["total_processing_time"] / metrics["total_messages_received"]
             )
  
  
@@ -84,8 +91,8 @@ def main():
  
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
+            size, addr = sock.recvfrom_into(recv_buffer, RECV_BUFFER_SIZE)
+            message = json.loads(str(recv_view[:size], "utf-8"))
             logging.info(f"Received from {addr}: {message}")
             process_message(message)
         except json.JSONDecodeError:
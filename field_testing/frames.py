@@ -0,0 +1,63 @@
+import json
+import struct
+import time
+
+# Data packets and their ACKs have a fixed schema, so they travel as packed binary
+# frames instead of JSON text. Announcements and everything a satellite forwards
+# stay JSON. The first byte tells the two apart: a frame tag is never "{".
+DATA_TAG = 1
+ACK_TAG = 2
+
+# IDs are NUL padded to a fixed 16 bytes
+ID_SIZE = 16
+
+# Tag, latitude, longitude, send time in microseconds, vehicle ID (NUL padded)
+DATA_FRAME = struct.Struct("!BddQ16s")
+# Tag, satellite ID, vehicle ID (both NUL padded)
+ACK_FRAME = struct.Struct("!B16s16s")
+
+
+def pack_data(vehicle_id, latitude, longitude, timestamp_us):
+    """Pack a GPS data message into a binary frame."""
+    return DATA_FRAME.pack(DATA_TAG, latitude, longitude, timestamp_us, _id_field(vehicle_id))
+
+
+def pack_ack(source, destination):
+    """Pack an ACK from a satellite to a vehicle into a binary frame."""
+    return ACK_FRAME.pack(ACK_TAG, _id_field(source), _id_field(destination))
+
+
+def _id_field(text):
+    # struct would silently cut a longer ID, and ACKs would go to the cut-down name
+    field = text.encode("utf-8")
+    if len(field) > ID_SIZE:
+        raise ValueError(f"ID {text!r} is longer than {ID_SIZE} bytes")
+    return field
+
+
+def _text(field):
+    return field.rstrip(b"\0").decode("utf-8")
+
+
+def decode_message(data):
+    """Decode a datagram into a message dict, whether it is a binary frame or JSON."""
+    if data[0] == DATA_TAG and len(data) == DATA_FRAME.size:
+        _, latitude, longitude, timestamp_us, vehicle_id = DATA_FRAME.unpack(data)
+        vehicle_id = _text(vehicle_id)
+        return {
+            "type": "data",
+            "source": vehicle_id,
+            "destination": "satellite",
+            "payload": {"gps": {"latitude": latitude, "longitude": longitude}},
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp_us // 1000000)),
+            "id": f"{vehicle_id}-{timestamp_us}",
+        }
+    if data[0] == ACK_TAG and len(data) == ACK_FRAME.size:
+        _, source, destination = ACK_FRAME.unpack(data)
+        return {
+            "type": "ack",
+            "source": _text(source),
+            "destination": _text(destination),
+            "payload": {"status": "received"},
+        }
+    return json.loads(str(data, "utf-8"))
@@ -6,6 +6,7 @@ import sys
 import queue
 import random
 import logging
+from frames import decode_message, pack_ack
  
 # Configuration
 SATELLITE_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33001
@@ -20,6 +21,7 @@ PACKET_LOSS_PROBABILITY = 0.1  # Simulated 10% chance of packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes/second
 MAX_RETRIES = 3  # Max retries for packet forwarding
 PRIORITY_LEVELS = 5  # Levels of priority for handling messages
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
  
 # Metrics
 metrics = {
@@ -59,6 +61,11 @@ NEIGHBORS = [
     {"id": "sat_5", "ip": "127.0.0.1", "port": 33005},
 ]
  
+# Datagrams are received into one preallocated buffer instead of a new bytes object each;
+# recvfrom(1024) silently truncated anything longer
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
+ 
 # Message Tracking
 recent_messages = {}
 message_queue = queue.PriorityQueue()
@@ -196,8 +203,8 @@ def route_data(message):
  
 def send_ack(sock, addr, vehicle_id):
     """Send acknowledgment to the vehicle."""
-    ack_message = create_message("ack", f"satellite_{SATELLITE_PORT}", vehicle_id, {"status": "received"})
-    sock.sendto(ack_message.encode(), (addr[0], ACK_LISTEN_PORT))
+    ack_message = pack_ack(f"satellite_{SATELLITE_PORT}", vehicle_id)
+    sock.sendto(ack_message, (addr[0], ACK_LISTEN_PORT))
     with metrics_lock:
         metrics["total_acks_sent"] += 1
     logging.info(f"Sent ACK to Vehicle {vehicle_id} at {addr[0]}:{ACK_LISTEN_PORT}")
@@ -257,8 +264,8 @@ def main():
  
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
+            size, addr = sock.recvfrom_into(recv_buffer, RECV_BUFFER_SIZE)
+            message = decode_message(recv_view[:size])  # Binary data frame from a vehicle, or JSON
             logging.info(f"Received data from {addr}: {message}")
             connection_queue.put((addr, message))
         except Exception as e:
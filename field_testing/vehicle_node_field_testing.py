@@ -3,7 +3,10 @@ import json
 import time
 import random
 import threading
+import array
+import selectors
 import logging
+from frames import ACK_FRAME, ACK_TAG, decode_message, pack_data
 
 # Configuration
 BROADCAST_PORT = 34000
@@ -12,23 +15,77 @@ SATELLITE_DISCOVERY_TIMEOUT = 10  # Timeout for satellite discovery
 DATA_SEND_INTERVAL = 5  # Interval between data transmissions
 MAX_RETRIES = 3  # Maximum number of retries for sending data
 ACK_TIMEOUT = 2  # Timeout for waiting for an ACK
-SATELLITE_REDISCOVERY_INTERVAL = 60  # Rediscovery interval for satellites
+RETRY_BACKOFF_BASE = 0.05  # First retry waits about this long (seconds)
+RETRY_BACKOFF_CAP = 0.4  # Upper bound on the wait between retries (seconds)
+SATELLITE_COOLDOWN = 30  # Skip a satellite for this long after it exhausts its retries (seconds)
+RECV_BUFFER_SIZE = 65536  # Reused receive buffers, large enough for any UDP datagram
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # Kernel send/receive queues, sized to ride out bursts
+SATELLITE_EXPIRY = 120  # Forget satellites not heard from for this long (seconds)
 PACKET_LOSS_PROBABILITY = 0.1  # 10% chance of packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes per second
+RANDOM_BATCH_SIZE = 4096  # GPS fixes, vehicle IDs and packet-loss decisions drawn per batch
 
-# Metrics tracking
+# Metrics tracking; display_metrics fills this in from the per-thread counters
 metrics = {
     "total_messages_sent": 0,
     "successful_transmissions": 0,
     "retransmissions": 0,
     "failed_transmissions": 0,
+    "total_response_time": 0,
     "average_response_time": 0,
     "discovered_satellites": 0,
 }
 
-# Thread-safe lock for metrics
+# Per-thread counters are arrays indexed by these slots; aggregate_metrics maps them back to names.
+# Response time is counted in whole microseconds so every slot fits an unsigned 64-bit integer.
+COUNTERS = (
+    "total_messages_sent",
+    "successful_transmissions",
+    "retransmissions",
+    "failed_transmissions",
+    "total_response_time",
+    "discovered_satellites",
+)
+(TOTAL_MESSAGES_SENT, SUCCESSFUL_TRANSMISSIONS, RETRANSMISSIONS, FAILED_TRANSMISSIONS,
+ TOTAL_RESPONSE_TIME_US, DISCOVERED_SATELLITES) = range(len(COUNTERS))
+
+# Datagrams are received into preallocated buffers instead of a new bytes object each
+discovery_buffer = bytearray(RECV_BUFFER_SIZE)
+discovery_view = memoryview(discovery_buffer)
+ack_buffer = bytearray(RECV_BUFFER_SIZE)
+ack_view = memoryview(ack_buffer)
+
+# Substring every announcement contains; checking for it in the raw buffer
+# skips stray traffic without a full JSON parse
+ANNOUNCEMENT_MARKER = b'"announcement"'
+
+# Pre-drawn GPS fixes, vehicle IDs and packet-loss decisions, refilled when exhausted
+gps_batch = iter(())
+vehicle_id_batch = iter(())
+loss_decisions = iter(())
+
+# Guards registration of per-thread counters and the aggregated metrics
 metrics_lock = threading.Lock()
 
+# Each thread counts into its own array, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+
+
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = array.array("Q", [0] * len(COUNTERS))
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
+
+
+def update_metric(slot, increment=1):
+    """Record a metric in the calling thread's counters."""
+    thread_counters()[slot] += increment
+
 # Logging Configuration
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -37,183 +94,264 @@ logging.basicConfig(
 )
 
 
-def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
-        "type": msg_type,
-        "source": source,
-        "destination": destination,
-        "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": "%s-%d" % (source, int(time.time() * 1000000))  # Unique ID for the message using microseconds
-    })
+def create_data_message(vehicle_id, gps_data):
+    """Create a GPS data message as a binary frame; the satellite rebuilds the timestamp and ID."""
+    return pack_data(vehicle_id, gps_data["latitude"], gps_data["longitude"], int(time.time() * 1000000))
+
+
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
+    with metrics_lock:
+        for slot, key in enumerate(COUNTERS):
+            metrics[key] = sum(counters[slot] for counters in registered_counters)
+        metrics["total_response_time"] /= 1000000
+        if metrics["successful_transmissions"]:
+            metrics["average_response_time"] = (
+                metrics["total_response_time"] / metrics["successful_transmissions"]
+            )
+        return dict(metrics)
 
 
 def simulate_packet_loss():
-    """Simulate packet loss based on probability."""
-    return random.random() < PACKET_LOSS_PROBABILITY
+    """Simulate packet loss based on probability, drawing decisions in batches."""
+    global loss_decisions
+    try:
+        return next(loss_decisions)
+    except StopIteration:
+        loss_decisions = iter([random.random() < PACKET_LOSS_PROBABILITY for _ in range(RANDOM_BATCH_SIZE)])
+        return next(loss_decisions)
 
 
 def simulate_bandwidth(data):
     """Simulate bandwidth constraints."""
-    data_size = len(data.encode("utf-8"))  # Size in bytes
+    data_size = len(data)  # Size in bytes
     delay = float(data_size) / BANDWIDTH_LIMIT  # Simulated delay
     time.sleep(delay)
 
 
-def discover_satellites():
-    """Discover satellites via broadcast."""
-    discovered = {}
+def enlarge_socket_buffers(sock):
+    """Grow the kernel queues so bursts are not dropped while the node is busy."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+
+
+def open_discovery_socket():
+    """Open the broadcast socket that receives satellite announcements."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    # Every socket sharing the port gets its own copy of a broadcast, so several
+    # vehicle nodes on one host can listen for announcements at once
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    enlarge_socket_buffers(sock)
     sock.bind(("", BROADCAST_PORT))
-    sock.settimeout(1)  # Short timeout for each listen cycle
-    logging.info("Listening for satellite broadcasts...")
+    sock.setblocking(False)
+    return sock
 
-    start_time = time.time()
-    while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data)
-            if message["type"] == "announcement" and "port" in message["payload"]:
-                discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
-                logging.info("Discovered Satellite %s on IP %s Port %s" % (
-                    message["source"], addr[0], message["payload"]["port"]))
-                with metrics_lock:
-                    metrics["discovered_satellites"] += 1
-        except socket.timeout:
+
+def receive_announcement(sock, satellites):
+    """Read one datagram from the discovery socket and record the satellite it announces."""
+    try:
+        size, addr = sock.recvfrom_into(discovery_buffer, RECV_BUFFER_SIZE)
+        if discovery_buffer.find(ANNOUNCEMENT_MARKER, 0, size) < 0:
+            return
+        message = json.loads(str(discovery_view[:size], "utf-8"))
+        if message["type"] == "announcement" and "port" in message["payload"]:
+            source, port = message["source"], message["payload"]["port"]
+            if source not in satellites:
+                logging.info("Discovered Satellite %s on IP %s Port %s", source, addr[0], port)
+                update_metric(DISCOVERED_SATELLITES)
+            satellites[source] = {"ip": addr[0], "port": port, "last_seen": time.time()}
+    except Exception as e:
+        logging.error("Error during satellite discovery: %s", e)
+
+
+def listen_for_announcements(selector, sock, satellites, duration):
+    """Record announcements as they arrive for duration seconds, then forget silent satellites."""
+    deadline = time.time() + duration
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        if selector.select(remaining):
+            receive_announcement(sock, satellites)
+
+    cutoff = time.time() - SATELLITE_EXPIRY
+    for satellite in [name for name, details in satellites.items() if details["last_seen"] < cutoff]:
+        logging.warning("Satellite %s has not announced itself for %d seconds, removing it.",
+            satellite, SATELLITE_EXPIRY)
+        del satellites[satellite]
+
+
+def retry_backoff(attempt):
+    """Return a capped, jittered delay before the retry that follows attempt."""
+    return min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * (1 << attempt)) * (0.5 + random.random())
+
+
+def wait_for_ack(sock, selector, vehicle_id, timeout):
+    """Read ACKs until one addressed to vehicle_id arrives; return False once timeout expires."""
+    now, select, recv_into = time.time, selector.select, sock.recvfrom_into
+    deadline = now() + timeout
+    while True:
+        remaining = deadline - now()
+        if remaining <= 0 or not select(remaining):
+            return False
+        size, addr = recv_into(ack_buffer, RECV_BUFFER_SIZE)
+        if size != ACK_FRAME.size or ack_buffer[0] != ACK_TAG:
             continue
-        except Exception as e:
-            logging.error("Error during satellite discovery: %s" % e)
-    sock.close()
-    return discovered
+        ack_message = decode_message(ack_view[:size])
+        logging.info("Received ACK from %s: %s", addr, ack_message)
+
+        # Each data packet uses a fresh vehicle ID, so late ACKs for an earlier packet are
+        # addressed elsewhere; they are discarded and the wait goes on
+        if ack_message["destination"] == vehicle_id and ack_message["source"].startswith("satellite"):
+            logging.info("ACK validated from Satellite %s.", ack_message["source"])
+            return True
 
 
-def send_data(sock, satellite_ip, satellite_port, message):
+def send_data(sock, selector, satellite_ip, satellite_port, message, vehicle_id):
     """Send data to a satellite and wait for acknowledgment."""
+    # This runs for every packet, so everything it calls is looked up once up front
+    # and the loop body only touches locals
+    now, info, sendto = time.time, logging.info, sock.sendto
+    counters = thread_counters()
+    address = (satellite_ip, satellite_port)
     for attempt in range(MAX_RETRIES):
         try:
             if simulate_packet_loss():
-                logging.warning("Simulated packet loss during transmission to %s:%s." % (satellite_ip, satellite_port))
+                logging.warning("Simulated packet loss during transmission to %s:%s.", satellite_ip, satellite_port)
                 continue
 
-            start_time = time.time()
+            start_time = now()
             simulate_bandwidth(message)  # Simulate bandwidth constraints
-            sock.sendto(message.encode("utf-8"), (satellite_ip, satellite_port))
-            logging.info("Sent data to %s:%s: %s" % (satellite_ip, satellite_port, message))
-            with metrics_lock:
-                metrics["total_messages_sent"] += 1
+            sendto(message, address)
+            info("Sent %d bytes of data to %s:%s.", len(message), satellite_ip, satellite_port)
+            counters[TOTAL_MESSAGES_SENT] += 1
 
             # Wait for acknowledgment
-            sock.settimeout(ACK_TIMEOUT)
-            logging.info("Waiting for ACK on port %s..." % ACK_LISTEN_PORT)
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(ack)
-            logging.info("Received ACK from %s: %s" % (addr, ack_message))
-
-            if ack_message["type"] == "ack" and ack_message["source"].startswith("satellite"):
-                with metrics_lock:
-                    metrics["successful_transmissions"] += 1
-                    response_time = time.time() - start_time
-                    metrics["average_response_time"] = (
-                        (metrics["average_response_time"] + response_time) / 2
-                    )
-                logging.info("ACK validated from Satellite %s." % ack_message["source"])
-                return True
+            info("Waiting for ACK on port %s...", ACK_LISTEN_PORT)
+            if not wait_for_ack(sock, selector, vehicle_id, ACK_TIMEOUT):
+                raise socket.timeout("timed out waiting for ACK")
+            counters[SUCCESSFUL_TRANSMISSIONS] += 1
+            counters[TOTAL_RESPONSE_TIME_US] += int((now() - start_time) * 1000000)
+            return True
         except socket.timeout:
-            logging.warning("No ACK received from %s:%s, attempt %d/%d." % (
-                satellite_ip, satellite_port, attempt + 1, MAX_RETRIES))
-            with metrics_lock:
-                metrics["retransmissions"] += 1
-            time.sleep(2 ** attempt)  # Exponential backoff
+            logging.warning("No ACK received from %s:%s, attempt %d/%d.",
+                satellite_ip, satellite_port, attempt + 1, MAX_RETRIES)
+            # Short jittered backoff, spent waiting for a late ACK; the packet is only
+            # sent again if none arrives
+            if wait_for_ack(sock, selector, vehicle_id, retry_backoff(attempt)):
+                counters[SUCCESSFUL_TRANSMISSIONS] += 1
+                counters[TOTAL_RESPONSE_TIME_US] += int((now() - start_time) * 1000000)
+                return True
+            counters[RETRANSMISSIONS] += 1
         except Exception as e:
-            logging.error("Error during ACK handling: %s" % e)
+            logging.error("Error during ACK handling: %s", e)
 
-    with metrics_lock:
-        metrics["failed_transmissions"] += 1
+    counters[FAILED_TRANSMISSIONS] += 1
     return False
 
 
 def generate_gps_data():
-    """Generate random GPS data."""
-    latitude = random.uniform(-90, 90)
-    longitude = random.uniform(-180, 180)
-    logging.info("Generated GPS data: Latitude=%s, Longitude=%s" % (latitude, longitude))
+    """Generate random GPS data, drawing coordinates in batches."""
+    global gps_batch
+    try:
+        latitude, longitude = next(gps_batch)
+    except StopIteration:
+        uniform = random.uniform
+        gps_batch = iter([(uniform(-90, 90), uniform(-180, 180)) for _ in range(RANDOM_BATCH_SIZE)])
+        latitude, longitude = next(gps_batch)
+    logging.info("Generated GPS data: Latitude=%s, Longitude=%s", latitude, longitude)
     return {"latitude": latitude, "longitude": longitude}
 
 
 def generate_vehicle_id():
-    """Generate a random vehicle ID."""
-    vehicle_id = "vehicle_%d" % random.randint(1000, 9999)
-    logging.info("Generated Vehicle ID: %s" % vehicle_id)
+    """Generate a random vehicle ID, drawing IDs in batches."""
+    global vehicle_id_batch
+    try:
+        vehicle_id = next(vehicle_id_batch)
+    except StopIteration:
+        numbers = random.choices(range(1000, 10000), k=RANDOM_BATCH_SIZE)
+        vehicle_id_batch = iter(["vehicle_%d" % number for number in numbers])
+        vehicle_id = next(vehicle_id_batch)
+    logging.info("Generated Vehicle ID: %s", vehicle_id)
     return vehicle_id
 
 
-def rediscover_satellites(satellites):
-    """Periodically rediscover satellites."""
-    while True:
-        time.sleep(SATELLITE_REDISCOVERY_INTERVAL)
-        logging.info("Rediscovering satellites...")
-        new_satellites = discover_satellites()
-        satellites.update(new_satellites)
-        logging.info("Updated Satellite List: %s" % satellites)
-
-
 def display_metrics():
     """Display metrics periodically."""
     while True:
         time.sleep(30)
-        with metrics_lock:
-            logging.info("Metrics: %s" % metrics)
+        logging.info("Metrics: %s", aggregate_metrics())
 
 
 def main():
     """Main vehicle node function."""
-    satellites = discover_satellites()
+    # The discovery socket stays open: announcements keep the satellite list current
+    # while the node waits between transmissions, so no rediscovery pass is needed
+    discovery_sock = open_discovery_socket()
+    discovery_selector = selectors.DefaultSelector()
+    discovery_selector.register(discovery_sock, selectors.EVENT_READ)
+    logging.info("Listening for satellite broadcasts...")
+
+    satellites = {}
+    listen_for_announcements(discovery_selector, discovery_sock, satellites, SATELLITE_DISCOVERY_TIMEOUT)
 
     if not satellites:
         logging.error("No satellites discovered. Exiting...")
+        discovery_selector.close()
+        discovery_sock.close()
         return
 
-    # Start a background thread for periodic rediscovery
-    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(satellites,))
-    rediscovery_thread.setDaemon(True)
-    rediscovery_thread.start()
-
     # Start a thread for displaying metrics
     metrics_thread = threading.Thread(target=display_metrics)
     metrics_thread.setDaemon(True)
     metrics_thread.start()
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    enlarge_socket_buffers(sock)
     sock.bind(("", ACK_LISTEN_PORT))
-    logging.info("Listening for ACKs on port %s." % ACK_LISTEN_PORT)
+    sock.setblocking(False)
+    # One selector registration serves every ACK wait; no per-attempt settimeout
+    ack_selector = selectors.DefaultSelector()
+    ack_selector.register(sock, selectors.EVENT_READ)
+    logging.info("Listening for ACKs on port %s.", ACK_LISTEN_PORT)
+    cooldowns = {}  # Satellite name -> time until which it is skipped
 
     try:
         while True:
             vehicle_id = generate_vehicle_id()
             gps_data = generate_gps_data()
 
-            logging.info("Generated new data - Vehicle ID: %s, GPS: %s" % (vehicle_id, gps_data))
+            logging.info("Generated new data - Vehicle ID: %s, GPS: %s", vehicle_id, gps_data)
 
-            message = create_message("data", vehicle_id, "satellite", {"gps": gps_data})
+            message = create_data_message(vehicle_id, gps_data)
 
-            for satellite, details in satellites.items():
-                logging.info("Attempting to send data to Satellite %s at %s:%s" % (
-                    satellite, details["ip"], details["port"]))
-                success = send_data(sock, details["ip"], details["port"], message)
+            # Satellites that recently exhausted their retries are skipped while they cool
+            # down, unless every satellite is cooling down
+            now = time.time()
+            candidates = [(satellite, details) for satellite, details in satellites.items()
+                if cooldowns.get(satellite, 0) <= now] or list(satellites.items())
+            for satellite, details in candidates:
+                logging.info("Attempting to send data to Satellite %s at %s:%s",
+                    satellite, details["ip"], details["port"])
+                success = send_data(sock, ack_selector, details["ip"], details["port"], message, vehicle_id)
 
                 if success:
-                    logging.info("Data successfully transmitted and acknowledged by Satellite %s." % satellite)
+                    logging.info("Data successfully transmitted and acknowledged by Satellite %s.", satellite)
                     break
                 else:
-                    logging.warning("Failed to send data to Satellite %s after %d retries." % (
-                        satellite, MAX_RETRIES))
+                    logging.warning("Failed to send data to Satellite %s after %d retries.",
+                        satellite, MAX_RETRIES)
+                    cooldowns[satellite] = time.time() + SATELLITE_COOLDOWN
 
-            logging.info("Waiting for %d seconds before sending the next data packet..." % DATA_SEND_INTERVAL)
-            time.sleep(DATA_SEND_INTERVAL)
+            logging.info("Waiting for %d seconds before sending the next data packet...", DATA_SEND_INTERVAL)
+            listen_for_announcements(discovery_selector, discovery_sock, satellites, DATA_SEND_INTERVAL)
     finally:
+        ack_selector.close()
         sock.close()
+        discovery_selector.close()
+        discovery_sock.close()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import json
  
 # Configuration
 COMMAND_STATION_PORT = 33500
+RECV_BUFFER_SIZE = 65536  # Batched GPS messages outgrow a 1 KiB buffer
  
  
 def process_message(message):
@@ -25,8 +26,8 @@ def main():
  
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
+            data, addr = sock.recvfrom(RECV_BUFFER_SIZE)
+            message = json.loads(data)  # json.loads accepts the UTF-8 bytes directly
             print(f"Received from {addr}:")
             process_message(message)
         except Exception as e:
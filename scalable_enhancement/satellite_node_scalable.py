@@ -3,9 +3,18 @@ import json
 import time
 import threading
 import sys
+import os
 import queue
+import collections
+import itertools
+import heapq
 import random
 import logging
+import logging.handlers
+import atexit
+import selectors
+from mmsg_util import recv_batch, send_batch
+from transport_util import TokenBucket, claim_port
  
 # Configuration
 SATELLITE_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33001
@@ -13,30 +22,48 @@ BROADCAST_PORT = 34000
 COMMAND_STATION_IP = "10.35.70.19"  # Replace with actual Command Station IP
 COMMAND_STATION_PORT = 33500
 BROADCAST_INTERVAL = 5  # Interval between broadcast announcements (seconds)
+METRICS_INTERVAL = 30  # Interval between metrics reports (seconds)
 ACK_LISTEN_PORT = 33020  # Port for receiving ACKs
-MAX_CONNECTIONS = 5  # Max simultaneous connection handlers
+MAX_CONNECTIONS = 5  # Receiver sockets (and reader threads) sharing SATELLITE_PORT
 ISL_DELAY = 0.2  # Inter-Satellite Link delay (seconds)
 PACKET_LOSS_PROBABILITY = 0.1  # 10% chance of packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes/second
 MAX_RETRIES = 3  # Max retries for packet forwarding
 PRIORITY_LEVELS = 5  # Levels of priority for handling messages
+SEND_BATCH_SIZE = 100  # Most queued datagrams handed to one sendmmsg call
+DUPLICATE_WINDOW = 10  # Seconds a message ID is remembered for duplicate detection
+MAX_RECENT_MESSAGES = 65536  # Upper bound on remembered message IDs
+MAX_ACK_SOCKETS = 64  # Connected ACK sockets kept for recent vehicles
+SIMULATE_NETWORK = os.environ.get("SIMULATE") == "1"  # Apply the ISL delay and bandwidth limit
  
-# Metrics
+# Metrics; display_metrics fills the counters in from the per-thread counters
 metrics = {
     "total_packets_received": 0,
     "total_packets_forwarded": 0,
     "total_packets_dropped": 0,
     "total_acks_sent": 0,
+    "total_gps_samples": 0,
     "average_processing_time": 0,
 }
-metrics_lock = threading.Lock()
- 
-# Logging Configuration
-logging.basicConfig(
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    level=logging.INFO,
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+metrics_lock = threading.Lock()  # Guards counter registration and the aggregated metrics
+ 
+# Counters kept per thread: every metric but the average, plus the processing time total
+# and message count that display_metrics computes the average from
+COUNTERS = [key for key in metrics if key != "average_processing_time"] + ["processing_time_ns", "messages_handled"]
+ 
+# Each thread counts into its own dict, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+ 
+# Logging Configuration; records go through a queue and a listener thread writes them,
+# so reader and sender threads never wait on console I/O. Per-packet messages are DEBUG
+# so they cost a level check when disabled
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+logging.root.setLevel(logging.INFO)
  
 # Routing Table and Neighbors
 ROUTING_TABLE = {
@@ -58,35 +85,132 @@ NEIGHBORS = [
     {"id": "sat_5", "ip": "127.0.0.1", "port": 33005},
 ]
  
-# Message Tracking
-recent_messages = {}
+# Flattened lookups for route_data: destination -> next hop, and neighbor ID -> (ip, port)
+NEXT_HOP = {destination: route["next_hop"] for destination, route in ROUTING_TABLE.items()}
+NEIGHBORS_BY_ID = {n["id"]: (n["ip"], n["port"]) for n in NEIGHBORS}
+ 
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+json_decoder = json.JSONDecoder()
+ 
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, ""]
+ 
+# This satellite only originates announcements and ACKs, which are never checked for
+# duplicates, so a per-process counter is enough to tell its messages apart
+message_ids = itertools.count(1)
+ 
+# Decoded messages are read by attribute; a datagram missing a required field is
+# rejected once when it is decoded rather than wherever the field is first used
+Message = collections.namedtuple("Message", ["type", "source", "destination", "payload", "timestamp", "id"])
+ 
+# Message Tracking; IDs are kept in arrival order so expired ones are always at the front
+recent_messages = collections.OrderedDict()
+recent_messages_lock = threading.Lock()
 message_queue = queue.PriorityQueue()
-connection_queue = queue.Queue()
+ 
+# Connected ACK sockets for recently seen vehicles, least recently used first
+ack_socks = collections.OrderedDict()
+ack_socks_lock = threading.Lock()  # Shared by the reader threads
+ 
+# Forwards are queued as (data, (ip, port)) and sent in batches by the sender thread
+outbound_queue = queue.Queue()
+ 
+# Neighbor forwards waiting out the simulated ISL delay, as (deadline, order, data, address)
+delayed_forwards = []
+delayed_forwards_ready = threading.Condition()
+delayed_forward_order = itertools.count()  # Tie-breaker so equal deadlines never compare messages
  
  
 # Utility Functions
+bandwidth_bucket = TokenBucket(BANDWIDTH_LIMIT)
+ 
+ 
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = dict.fromkeys(COUNTERS, 0)
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
+ 
+ 
+def update_metric(key, increment=1):
+    """Record a metric in the calling thread's counters."""
+    thread_counters()[key] += increment
+ 
+ 
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
+    with metrics_lock:
+        totals = {key: sum(counters[key] for counters in registered_counters) for key in COUNTERS}
+        processing_time_ns = totals.pop("processing_time_ns")
+        messages_handled = totals.pop("messages_handled")
+        metrics.update(totals)
+        metrics["average_processing_time"] = processing_time_ns / max(messages_handled, 1) / 1e9
+        return dict(metrics)
+ 
+ 
 def is_duplicate(message_id):
     """Check if a message ID has already been processed."""
-    current_time = time.time()
-    if message_id in recent_messages:
-        if current_time - recent_messages[message_id] < 10:  # 10-second threshold
-            return True
+    current_time = time.monotonic()
+    with recent_messages_lock:
+        # Forget IDs older than the window, and the oldest ones if the cache is full
+        while recent_messages and (
+            current_time - next(iter(recent_messages.values())) >= DUPLICATE_WINDOW
+            or len(recent_messages) >= MAX_RECENT_MESSAGES
+        ):
+            recent_messages.popitem(last=False)
+        # Every ID left is inside the window, so one setdefault both checks and records:
+        # it hands back current_time itself only when the ID was not there yet
+        return recent_messages.setdefault(message_id, current_time) is not current_time
+ 
+ 
+def current_timestamp():
+    """Return the UTC timestamp, formatting it at most once per second."""
+    now = int(time.time())
+    if now != timestamp_cache[0]:
+        timestamp_cache[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))]
+    return timestamp_cache[1]
+ 
+ 
+def vehicle_ack_sock(vehicle_ip):
+    """Return a socket connected to a vehicle's ACK port, reusing recently used ones."""
+    with ack_socks_lock:
+        sock = ack_socks.get(vehicle_ip)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect((vehicle_ip, ACK_LISTEN_PORT))
+            ack_socks[vehicle_ip] = sock
+            if len(ack_socks) > MAX_ACK_SOCKETS:
+                # Not closed explicitly: a reader may still be sending on it, and the
+                # socket closes itself once the last reference is dropped
+                ack_socks.popitem(last=False)
         else:
-            del recent_messages[message_id]
-    recent_messages[message_id] = current_time
-    return False
+            ack_socks.move_to_end(vehicle_ip)
+        return sock
  
  
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
+    """Create a formatted message as wire-ready bytes."""
+    return json_encoder.encode({
         "type": msg_type,
         "source": source,
         "destination": destination,
         "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": f"{source}-{time.time_ns()}"
-    })
+        "timestamp": current_timestamp(),
+        "id": f"{source}-{next(message_ids)}"
+    }).encode()
+ 
+ 
+def decode_message(data):
+    """Decode a received datagram into a Message."""
+    fields = json_decoder.decode(str(data, "utf-8"))
+    return Message(
+        fields["type"], fields["source"], fields["destination"],
+        fields.get("payload"), fields.get("timestamp"), fields.get("id")
+    )
  
  
 def simulate_packet_loss():
@@ -94,172 +218,249 @@ def simulate_packet_loss():
     return random.random() < PACKET_LOSS_PROBABILITY
  
  
-def simulate_bandwidth(data):
-    """Simulate bandwidth constraints."""
-    data_size = len(data.encode())  # Size in bytes
-    delay = data_size / BANDWIDTH_LIMIT  # Simulated delay
-    time.sleep(delay)
+def simulate_bandwidth(data_size):
+    """Simulate bandwidth constraints for data_size bytes."""
+    if SIMULATE_NETWORK:
+        bandwidth_bucket.consume(data_size)
  
  
 # Satellite Functions
-def broadcast_presence():
-    """Broadcast satellite availability."""
+def open_broadcast_socket():
+    """Open the socket announcements are broadcast on."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     broadcast_address = "255.255.255.255"
+    # Connected once, so each announcement is a plain send with no address to convert
+    sock.connect((broadcast_address, BROADCAST_PORT))
+    return sock
  
-    while True:
-        try:
-            message = create_message(
-                "announcement", f"satellite_{SATELLITE_PORT}", "all", {"port": SATELLITE_PORT}
-            )
-            if not simulate_packet_loss():
-                simulate_bandwidth(message)
-                sock.sendto(message.encode(), (broadcast_address, BROADCAST_PORT))
-                logging.info(f"Broadcasted: {message}")
-            else:
-                with metrics_lock:
-                    metrics["total_packets_dropped"] += 1
-                logging.warning(f"Packet dropped during broadcast: {message}")
-            time.sleep(BROADCAST_INTERVAL)
-        except Exception as e:
-            logging.error(f"Error broadcasting presence: {e}")
+ 
+def broadcast_presence(sock):
+    """Broadcast satellite availability."""
+    try:
+        message = create_message(
+            "announcement", f"satellite_{SATELLITE_PORT}", "all", {"port": SATELLITE_PORT}
+        )
+        if not simulate_packet_loss():
+            simulate_bandwidth(len(message))
+            sock.send(message)
+            logging.info("Broadcasted: %s", message)
+        else:
+            update_metric("total_packets_dropped")
+            logging.warning("Packet dropped during broadcast: %s", message)
+    except Exception as e:
+        logging.error("Error broadcasting presence: %s", e)
  
  
 def forward_to_command_station(data):
-    """Forward data to the Command Station."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    for attempt in range(MAX_RETRIES):
-        try:
-            simulate_bandwidth(data)
-            sock.sendto(data.encode(), (COMMAND_STATION_IP, COMMAND_STATION_PORT))
-            logging.info("Forwarded data to Command Station.")
-            with metrics_lock:
-                metrics["total_packets_forwarded"] += 1
-            return
-        except Exception as e:
-            logging.error(f"Retry {attempt + 1}: Error forwarding to Command Station: {e}")
-            time.sleep(0.5)
-    with metrics_lock:
-        metrics["total_packets_dropped"] += 1
-    logging.error("Failed to forward to Command Station after retries.")
+    """Queue data for the Command Station."""
+    outbound_queue.put((data, (COMMAND_STATION_IP, COMMAND_STATION_PORT)))
+    logging.debug("Queued data for Command Station.")
+ 
  
+def forward_to_neighbor(message, neighbor_id, address):
+    """Queue data for a specific neighboring satellite, after the ISL delay when simulated."""
+    if SIMULATE_NETWORK:
+        with delayed_forwards_ready:
+            heapq.heappush(delayed_forwards, (time.monotonic() + ISL_DELAY, next(delayed_forward_order), message, address))
+            delayed_forwards_ready.notify()
+    else:
+        outbound_queue.put((message, address))
+    logging.debug("Queued data for neighbor %s at %s:%s", neighbor_id, address[0], address[1])
  
-def forward_to_neighbor(message, neighbor):
-    """Forward data to a specific neighboring satellite."""
+ 
+def delayed_forwarder():
+    """Queue each delayed neighbor forward once its ISL delay has elapsed."""
+    while True:
+        with delayed_forwards_ready:
+            while not delayed_forwards or delayed_forwards[0][0] > time.monotonic():
+                timeout = delayed_forwards[0][0] - time.monotonic() if delayed_forwards else None
+                delayed_forwards_ready.wait(timeout)
+            _, _, message, address = heapq.heappop(delayed_forwards)
+        outbound_queue.put((message, address))
+ 
+ 
+def outbound_sender():
+    """Send queued forwards in batches, one sendmmsg call per batch."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    for attempt in range(MAX_RETRIES):
+    while True:
+        # Block for the first packet, then take whatever else is already waiting
+        batch = [outbound_queue.get()]
         try:
-            simulate_bandwidth(message)
-            time.sleep(ISL_DELAY)
-            sock.sendto(message.encode(), (neighbor["ip"], neighbor["port"]))
-            logging.info(f"Forwarded to neighbor {neighbor['id']} at {neighbor['ip']}:{neighbor['port']}")
-            with metrics_lock:
-                metrics["total_packets_forwarded"] += 1
-            return
-        except Exception as e:
-            logging.error(f"Retry {attempt + 1}: Error forwarding to neighbor {neighbor['id']}: {e}")
-            time.sleep(0.5)
-    with metrics_lock:
-        metrics["total_packets_dropped"] += 1
-    logging.error(f"Failed to forward to neighbor {neighbor['id']} after retries.")
+            while len(batch) < SEND_BATCH_SIZE:
+                batch.append(outbound_queue.get_nowait())
+        except queue.Empty:
+            pass
+ 
+        # Bandwidth is simulated once per batch instead of once per packet
+        simulate_bandwidth(sum(len(data) for data, _ in batch))
+        for attempt in range(MAX_RETRIES):
+            try:
+                send_batch(sock, batch)
+                logging.debug("Forwarded a batch of %s packets.", len(batch))
+                update_metric("total_packets_forwarded", len(batch))
+                break
+            except Exception as e:
+                logging.error("Retry %s: Error forwarding batch: %s", attempt + 1, e)
+                time.sleep(0.5)
+        else:
+            update_metric("total_packets_dropped", len(batch))
+            logging.error("Failed to forward a batch of %s packets after retries.", len(batch))
+ 
  
+def drop_unroutable(message, next_hop):
+    """Drop data whose next hop is not a known neighbor."""
+    logging.error("No route to next hop %s.", next_hop)
  
-def route_data(message):
-    """Route data based on the routing table."""
-    destination = message["destination"]
  
-    if is_duplicate(message["id"]):
-        logging.warning(f"Duplicate message detected: {message['id']}")
+def build_routes():
+    """Resolve each routing-table destination to its forward function and arguments."""
+    routes = {}
+    for destination, next_hop in NEXT_HOP.items():
+        if next_hop == "command_station":
+            routes[destination] = (forward_to_command_station, ())
+        elif next_hop in NEIGHBORS_BY_ID:
+            routes[destination] = (forward_to_neighbor, (next_hop, NEIGHBORS_BY_ID[next_hop]))
+        else:
+            routes[destination] = (drop_unroutable, (next_hop,))
+    return routes
+ 
+ 
+# Routing is decided once here, so route_data only has to look the destination up
+ROUTES = build_routes()
+ 
+ 
+def route_data(message, data):
+    """Route data based on the routing table, forwarding the bytes exactly as received."""
+    destination = message.destination
+ 
+    if is_duplicate(message.id):
+        logging.warning("Duplicate message detected: %s", message.id)
         return
  
+    # Vehicles send their GPS readings in batches; older ones send a single "gps" reading
+    payload = message.payload or {}
+    update_metric("total_gps_samples", len(payload["gps_batch"]) if "gps_batch" in payload else 1)
+ 
     try:
-        if destination in ROUTING_TABLE:
-            next_hop = ROUTING_TABLE[destination]["next_hop"]
-            if next_hop == "command_station":
-                forward_to_command_station(json.dumps(message))
-            else:
-                neighbor = next((n for n in NEIGHBORS if n["id"] == next_hop), None)
-                if neighbor:
-                    forward_to_neighbor(json.dumps(message), neighbor)
-                else:
-                    logging.error(f"No route to next hop {next_hop}.")
+        route = ROUTES.get(destination)
+        if route is not None:
+            forward, args = route
+            forward(data, *args)
         else:
-            logging.warning(f"No route for destination '{destination}'. Using fallback to command station.")
-            forward_to_command_station(json.dumps(message))
+            logging.warning("No route for destination '%s'. Using fallback to command station.", destination)
+            forward_to_command_station(data)
     except Exception as e:
-        logging.error(f"Error routing message: {e}")
+        logging.error("Error routing message: %s", e)
  
  
-def send_ack(sock, addr, vehicle_id):
+def send_ack(addr, vehicle_id):
     """Send acknowledgment to the vehicle."""
     ack_message = create_message("ack", f"satellite_{SATELLITE_PORT}", vehicle_id, {"status": "received"})
-    sock.sendto(ack_message.encode(), (addr[0], ACK_LISTEN_PORT))
-    with metrics_lock:
-        metrics["total_acks_sent"] += 1
-    logging.info(f"Sent ACK to Vehicle {vehicle_id} at {addr[0]}:{ACK_LISTEN_PORT}")
+    sock = vehicle_ack_sock(addr[0])
+    try:
+        sock.send(ack_message)
+    except ConnectionRefusedError:
+        # A connected socket reports an earlier ACK's ICMP port-unreachable on its next
+        # send; that ACK is already lost, but this one has not been sent yet
+        sock.send(ack_message)
+    update_metric("total_acks_sent")
+    logging.debug("Sent ACK to Vehicle %s at %s:%s", vehicle_id, addr[0], ACK_LISTEN_PORT)
  
  
-def handle_connection(sock, addr, message):
+def handle_connection(addr, data, message):
     """Handle an individual connection."""
     try:
-        start_time = time.time()
-        logging.info(f"Handling message: {message}")
-        if message["type"] == "data":
-            route_data(message)
-            send_ack(sock, addr, message["source"])
-        with metrics_lock:
-            processing_time = time.time() - start_time
-            metrics["average_processing_time"] = (
-                (metrics["average_processing_time"] + processing_time) / 2
-            )
+        start_time = time.perf_counter_ns()
+        logging.debug("Handling message: %s", message)
+        if message.type == "data":
+            route_data(message, data)
+            send_ack(addr, message.source)
+        counters = thread_counters()
+        counters["processing_time_ns"] += time.perf_counter_ns() - start_time
+        counters["messages_handled"] += 1
     except Exception as e:
-        logging.error(f"Error handling connection: {e}")
+        logging.error("Error handling connection: %s", e)
  
  
-def connection_worker(sock):
-    """Worker thread to handle queued connections."""
-    while True:
+def receive_packets(sock):
+    """Drain up to a full batch from a readable receiver socket with one recvmmsg call and handle it."""
+    try:
+        packets = recv_batch(sock)
+    except Exception as e:
+        logging.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+        return
+    update_metric("total_packets_received", len(packets))
+    for data, addr in packets:
         try:
-            addr, message = connection_queue.get()
-            handle_connection(sock, addr, message)
-            connection_queue.task_done()
+            message = decode_message(data)
+            logging.debug("Received data from %s: %s", addr, message)
+            handle_connection(addr, data, message)
         except Exception as e:
-            logging.error(f"Error in connection worker: {e}")
+            logging.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+ 
+ 
+def receive_loop(sock):
+    """Read and handle every datagram arriving on one of the receiver sockets."""
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    while True:
+        sel.select()
+        receive_packets(sock)
  
  
 def display_metrics():
-    """Display metrics periodically."""
+    """Display the aggregated metrics."""
+    logging.info("Metrics for Satellite %s: %s", SATELLITE_PORT, aggregate_metrics())
+ 
+ 
+def event_loop(sock):
+    """Receive on sock and run the periodic broadcast and metrics report, all from one thread."""
+    broadcast_sock = open_broadcast_socket()
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    now = time.monotonic()
+    next_broadcast, next_metrics = now, now + METRICS_INTERVAL
     while True:
-        time.sleep(30)
-        with metrics_lock:
-            logging.info(f"Metrics for Satellite {SATELLITE_PORT}: {metrics}")
+        # Sleep until the socket is readable or the next timer is due, whichever is first
+        if sel.select(max(min(next_broadcast, next_metrics) - time.monotonic(), 0)):
+            receive_packets(sock)
+        now = time.monotonic()
+        if now >= next_broadcast:
+            broadcast_presence(broadcast_sock)
+            next_broadcast = now + BROADCAST_INTERVAL
+        if now >= next_metrics:
+            display_metrics()
+            next_metrics = now + METRICS_INTERVAL
  
  
 # Main Function
 def main():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    log_listener.start()
+    atexit.register(log_listener.stop)  # Flush queued records on exit
+ 
+    # Every receiver socket binds the same port; the kernel spreads incoming flows across
+    # them, and each has its own reader thread, so no single reader or queue serializes ingress
+    sockets = []
     try:
-        sock.bind(("", SATELLITE_PORT))
-        logging.info(f"Satellite {SATELLITE_PORT} listening on port {SATELLITE_PORT}.")
+        port_claim = claim_port(SATELLITE_PORT)  # SO_REUSEPORT alone would let a second satellite share the port
+        for _ in range(MAX_CONNECTIONS):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", SATELLITE_PORT))
+            sockets.append(sock)
+        logging.info("Satellite %s listening on port %s with %s receiver sockets.", SATELLITE_PORT, SATELLITE_PORT, len(sockets))
     except OSError as e:
-        logging.error(f"Failed to bind to port {SATELLITE_PORT}: {e}")
+        logging.error("Failed to bind to port %s: %s", SATELLITE_PORT, e)
         sys.exit(1)
  
-    for _ in range(MAX_CONNECTIONS):
-        threading.Thread(target=connection_worker, args=(sock,), daemon=True).start()
+    threading.Thread(target=outbound_sender, daemon=True).start()
+    threading.Thread(target=delayed_forwarder, daemon=True).start()
  
-    threading.Thread(target=broadcast_presence, daemon=True).start()
-    threading.Thread(target=display_metrics, daemon=True).start()
- 
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
-            logging.info(f"Received data from {addr}: {message}")
-            connection_queue.put((addr, message))
-        except Exception as e:
-            logging.error(f"Error on Satellite Node {SATELLITE_PORT}: {e}")
+    for sock in sockets[1:]:
+        threading.Thread(target=receive_loop, args=(sock,), daemon=True).start()
+    # The main thread reads the first socket and also runs the broadcast and metrics timers
+    event_loop(sockets[0])
  
  
 if __name__ == "__main__":
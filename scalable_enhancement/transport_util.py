@@ -0,0 +1 @@
+../short_path_enhancement/transport_util.py
\ No newline at end of file
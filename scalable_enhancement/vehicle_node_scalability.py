@@ -4,6 +4,8 @@ import time
 import random
 import threading
 import logging
+import select
+from mmsg_util import recv_batch
 
 # Configuration
 BROADCAST_PORT = 34000
@@ -13,6 +15,8 @@ DATA_SEND_INTERVAL = 5  # Interval between data transmissions
 MAX_RETRIES = 3  # Maximum number of retries for sending data
 ACK_TIMEOUT = 2  # Timeout for waiting for an ACK
 SATELLITE_REDISCOVERY_INTERVAL = 60  # Rediscovery interval for satellites
+GPS_BATCH_SIZE = 20  # GPS samples carried per data message; 20 still fit one 1500-byte datagram
+GPS_SAMPLE_INTERVAL = DATA_SEND_INTERVAL / GPS_BATCH_SIZE  # Time between GPS samples
 
 # Metrics tracking
 metrics = {
@@ -26,6 +30,15 @@ metrics = {
 # Thread-safe lock for metrics
 metrics_lock = threading.Lock()
 
+# Guards the satellite list, which the rediscovery thread updates while main sends
+satellites_lock = threading.Lock()
+
+# Compact separators keep datagrams small; one encoder is reused for every message
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+# Timestamps have one-second resolution, so each formatted second is reused
+timestamp_cache = [0, ""]
+
 # Logging Configuration
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -34,70 +47,103 @@ logging.basicConfig(
 )
 
 
+def current_timestamp():
+    """Return the UTC timestamp, formatting it at most once per second."""
+    now = int(time.time())
+    if now != timestamp_cache[0]:
+        timestamp_cache[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))]
+    return timestamp_cache[1]
+
+
 def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
+    """Create a formatted message as wire-ready bytes."""
+    return json_encoder.encode({
         "type": msg_type,
         "source": source,
         "destination": destination,
         "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "timestamp": current_timestamp(),
         "id": "{}-{}".format(source, int(time.time() * 1000000))  # Unique ID for the message using microseconds
-    })
+    }).encode('utf-8')
 
 
-def discover_satellites():
-    """Discover satellites via broadcast."""
-    discovered = {}
+def open_discovery_socket():
+    """Open the socket satellite announcements are received on."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     sock.bind(("", BROADCAST_PORT))
-    sock.settimeout(1)  # Short timeout for each listen cycle
+    return sock
+
+
+def discover_satellites(sock):
+    """Discover satellites via broadcast."""
+    discovered = {}
     logging.info("Listening for satellite broadcasts...")
 
     start_time = time.time()
-    while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data)
-            if message["type"] == "announcement" and "port" in message["payload"]:
-                discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
-                logging.info("Discovered Satellite {} on IP {} Port {}".format(
-                    message['source'], addr[0], message['payload']['port']))
-        except socket.timeout:
+    while True:
+        remaining = SATELLITE_DISCOVERY_TIMEOUT - (time.time() - start_time)
+        if remaining <= 0:
+            break
+        if not select.select([sock], [], [], remaining)[0]:
             continue
-        except Exception as e:
-            logging.error("Error during satellite discovery: {}".format(e))
-    sock.close()
+        # Every announcement that queued up since the last wakeup is read with one recvmmsg call
+        for data, addr in recv_batch(sock):
+            try:
+                message = json.loads(data)
+                if message["type"] == "announcement" and "port" in message["payload"]:
+                    discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
+                    logging.info("Discovered Satellite {} on IP {} Port {}".format(
+                        message['source'], addr[0], message['payload']['port']))
+            except Exception as e:
+                logging.error("Error during satellite discovery: {}".format(e))
     return discovered
 
 
-def send_data(sock, satellite_ip, satellite_port, message):
+def wait_for_ack(sock, vehicle_id, timeout):
+    """Read ACKs until one addressed to vehicle_id arrives; return False once timeout expires."""
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            return False
+        # Late ACKs from earlier attempts are drained in the same recvmmsg call
+        for ack, addr in recv_batch(sock):
+            try:
+                ack_message = json.loads(ack)
+                logging.info("Received ACK from {}: {}".format(addr, ack_message))
+
+                # Each message uses a fresh vehicle ID, so late ACKs for an earlier message are
+                # addressed elsewhere; they are discarded and the wait goes on
+                if (ack_message["type"] == "ack" and ack_message["destination"] == vehicle_id
+                        and ack_message["source"].startswith("satellite")):
+                    logging.info("ACK validated from Satellite {}.".format(ack_message['source']))
+                    return True
+            except Exception as e:
+                logging.error("Discarding malformed ACK from {}: {}".format(addr, e))
+
+
+def send_data(sock, satellite_ip, satellite_port, message, vehicle_id):
     """Send data to a satellite and wait for acknowledgment."""
     for attempt in range(MAX_RETRIES):
         try:
             start_time = time.time()
-            sock.sendto(message.encode('utf-8'), (satellite_ip, satellite_port))
+            sock.sendto(message, (satellite_ip, satellite_port))
             logging.info("Sent data to {}:{}: {}".format(satellite_ip, satellite_port, message))
             with metrics_lock:
                 metrics["total_messages_sent"] += 1
 
             # Wait for acknowledgment
-            sock.settimeout(ACK_TIMEOUT)
             logging.info("Waiting for ACK on port {}...".format(ACK_LISTEN_PORT))
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(ack)
-            logging.info("Received ACK from {}: {}".format(addr, ack_message))
-
-            if ack_message["type"] == "ack" and ack_message["source"].startswith("satellite"):
-                with metrics_lock:
-                    metrics["successful_transmissions"] += 1
-                    response_time = time.time() - start_time
-                    metrics["average_response_time"] = (
-                        (metrics["average_response_time"] + response_time) / 2
-                    )
-                logging.info("ACK validated from Satellite {}.".format(ack_message['source']))
-                return True
+            if not wait_for_ack(sock, vehicle_id, ACK_TIMEOUT):
+                raise socket.timeout("timed out waiting for ACK")
+            with metrics_lock:
+                metrics["successful_transmissions"] += 1
+                response_time = time.time() - start_time
+                metrics["average_response_time"] = (
+                    (metrics["average_response_time"] + response_time) / 2
+                )
+            return True
         except socket.timeout:
             logging.warning("No ACK received from {}:{}, attempt {}/{}.".format(
                 satellite_ip, satellite_port, attempt + 1, MAX_RETRIES))
@@ -127,13 +173,14 @@ def generate_vehicle_id():
     return vehicle_id
 
 
-def rediscover_satellites(satellites):
+def rediscover_satellites(discovery_sock, satellites):
     """Periodically rediscover satellites."""
     while True:
         time.sleep(SATELLITE_REDISCOVERY_INTERVAL)
         logging.info("Rediscovering satellites...")
-        new_satellites = discover_satellites()
-        satellites.update(new_satellites)
+        new_satellites = discover_satellites(discovery_sock)
+        with satellites_lock:
+            satellites.update(new_satellites)
         logging.info("Updated Satellite List: {}".format(satellites))
 
 
@@ -147,14 +194,17 @@ def display_metrics():
 
 def main():
     """Main vehicle node function."""
-    satellites = discover_satellites()
+    # One discovery socket is kept open and reused by every rediscovery
+    discovery_sock = open_discovery_socket()
+    satellites = discover_satellites(discovery_sock)
 
     if not satellites:
         logging.error("No satellites discovered. Exiting...")
+        discovery_sock.close()
         return
 
     # Start a background thread for periodic rediscovery
-    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(satellites,))
+    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(discovery_sock, satellites))
     rediscovery_thread.setDaemon(True)
     rediscovery_thread.start()
 
@@ -170,16 +220,29 @@ def main():
     try:
         while True:
             vehicle_id = generate_vehicle_id()
-            gps_data = generate_gps_data()
 
-            logging.info("Generated new data - Vehicle ID: {}, GPS: {}".format(vehicle_id, gps_data))
+            # Samples are buffered and sent together, so one datagram, one JSON encoding
+            # and one ACK round trip cover the whole batch instead of every reading
+            gps_batch = []
+            deadline = time.time() + DATA_SEND_INTERVAL
+            while True:
+                gps_batch.append(generate_gps_data())
+                if len(gps_batch) >= GPS_BATCH_SIZE or time.time() >= deadline:
+                    break
+                time.sleep(min(GPS_SAMPLE_INTERVAL, max(deadline - time.time(), 0)))
+
+            logging.info("Generated new data - Vehicle ID: {}, GPS samples: {}".format(vehicle_id, len(gps_batch)))
 
-            message = create_message("data", vehicle_id, "satellite", {"gps": gps_data})
+            message = create_message("data", vehicle_id, "satellite", {"gps_batch": gps_batch})
 
-            for satellite, details in satellites.iteritems():
+            # The message is encoded once above; send from a snapshot so rediscovery can
+            # update the list while this loop waits for ACKs
+            with satellites_lock:
+                snapshot = list(satellites.items())
+            for satellite, details in snapshot:
                 logging.info("Attempting to send data to Satellite {} at {}:{}".format(
                     satellite, details['ip'], details['port']))
-                success = send_data(sock, details["ip"], details["port"], message)
+                success = send_data(sock, details["ip"], details["port"], message, vehicle_id)
 
                 if success:
                     logging.info("Data successfully transmitted and acknowledged by Satellite {}.".format(satellite))
@@ -188,8 +251,6 @@ def main():
                     logging.warning("Failed to send data to Satellite {} after {} retries.".format(
                         satellite, MAX_RETRIES))
 
-            logging.info("Waiting for {} seconds before sending the next data packet...".format(DATA_SEND_INTERVAL))
-            time.sleep(DATA_SEND_INTERVAL)
     finally:
         sock.close()
 
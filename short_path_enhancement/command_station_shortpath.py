@@ -1,13 +1,20 @@
 import socket
 import json
+import os
 import logging
 import threading
 import time
 import sys
+import collections
+from frames import decode_message
+from transport_util import claim_port
  
 # Configuration
 COMMAND_STATION_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33500
 METRICS_UPDATE_INTERVAL = 30  # Interval for displaying metrics
+SOURCE_SHARDS = 16  # Independently locked shards of the per-source message counts
+RECEIVER_PROCESSES = 4  # Number of processes sharing COMMAND_STATION_PORT
+RECV_BUFFER_SIZE = 65536  # Reused receive buffer, large enough for any UDP datagram
  
 # Metrics tracking
 metrics = {
@@ -21,6 +28,15 @@ metrics = {
 }
 metrics_lock = threading.Lock()
  
+# Per-source counts are split across shards by hash(source), each with its own lock,
+# so counting a message never waits on metrics_lock; display_metrics merges them
+source_shards = [(threading.Lock(), collections.defaultdict(int)) for _ in range(SOURCE_SHARDS)]
+ 
+# Datagrams are received into one preallocated buffer instead of a new bytes object each;
+# recvfrom(1024) silently truncated anything longer
+recv_buffer = bytearray(RECV_BUFFER_SIZE)
+recv_view = memoryview(recv_buffer)
+ 
 # Logging Configuration
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -35,42 +51,53 @@ def update_metric(key, increment=1):
         if key in metrics:
             metrics[key] += increment
  
-def log_message(level, message):
-    """Centralized logging function."""
+def log_message(level, message, *args):
+    """Centralized logging function; args are only formatted if the record is emitted."""
     log_function = {
         "info": logging.info,
         "warning": logging.warning,
         "error": logging.error,
     }.get(level.lower(), logging.info)
-    log_function(message)
+    log_function(message, *args)
+ 
+def count_source(source):
+    """Count a message from source in its shard."""
+    shard_lock, counts = source_shards[hash(source) % SOURCE_SHARDS]
+    with shard_lock:
+        counts[source] += 1
+ 
+def source_counts():
+    """Merge the per-source counts from every shard."""
+    merged = {}
+    for shard_lock, counts in source_shards:
+        with shard_lock:
+            merged.update(counts)
+    return merged
  
 def process_message(message, addr):
     """Processes incoming messages, differentiating control and data types."""
     start_time = time.time()
     try:
-        source = message.get("source", "unknown")
-        message_type = message.get("type", "unknown")
+        source = message.source
+        message_type = message.type
         # Track source
-        with metrics_lock:
-            if source not in metrics["sources"]:
-                metrics["sources"][source] = 0
-            metrics["sources"][source] += 1
+        count_source(source)
  
         # Process message by type
         if message_type == "control":
-            log_message("info", f"[Control Message from {addr}] {json.dumps(message, indent=2)}")
+            log_message("info", "[Control Message from %s] %s", addr, message)
             update_metric("control_messages_received")
         elif message_type == "data":
-            log_message("info", f"[Data Message from {addr}] {json.dumps(message, indent=2)}")
+            log_message("info", "[Data Message from %s] %s", addr, message)
             update_metric("data_messages_received")
         else:
-            log_message("warning", f"[Unknown Message Type from {addr}] {json.dumps(message, indent=2)}")
+            log_message("warning", "[Unknown Message Type from %s] %s", addr, message)
             update_metric("unknown_messages_received")
  
     except KeyError as e:
-        log_message("error", f"Missing key in message from {addr}: {e}")
+        log_message("error", "Missing key in message from %s: %s", addr, e)
     except Exception as e:
-        log_message("error", f"Error processing message from {addr}: {e}")
+        log_message("error", "Error processing message from %s: %s", addr, e)
     finally:
         processing_time = time.time() - start_time
         with metrics_lock:
@@ -83,39 +110,56 @@ def process_message(message, addr):
  
 def handle_malformed_message(addr, data):
     """Handle cases where the message is malformed."""
-    log_message("warning", f"Malformed message from {addr}: {data}")
+    log_message("warning", "Malformed message from %s: %s", addr, data)
     update_metric("malformed_messages_received")
  
 def display_metrics():
     """Periodically display metrics to monitor the performance and received messages."""
     while True:
         time.sleep(METRICS_UPDATE_INTERVAL)
+        sources = source_counts()
         with metrics_lock:
-            log_message("info", f"Metrics: {json.dumps(metrics, indent=2)}")
+            metrics["sources"] = sources
+            log_message("info", "Metrics (process %s): %s", os.getpid(), json.dumps(metrics, indent=2))
+ 
+def create_listener():
+    """Create a UDP socket that shares COMMAND_STATION_PORT with the other receiver processes."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", COMMAND_STATION_PORT))
+    return sock
  
 # Main Function
 def main():
     """Command Station main function."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        sock.bind(("", COMMAND_STATION_PORT))
+        port_claim = claim_port(COMMAND_STATION_PORT)  # SO_REUSEPORT alone would let a second station share the port
+        sock = create_listener()
         log_message("info", f"Command Station listening on port {COMMAND_STATION_PORT}...")
     except OSError as e:
         log_message("error", f"Failed to bind to port {COMMAND_STATION_PORT}: {e}")
         return
  
+    # The kernel spreads datagrams across every socket bound with SO_REUSEPORT,
+    # so each forked process decodes its share in parallel
+    for _ in range(RECEIVER_PROCESSES - 1):
+        if os.fork() == 0:
+            sock.close()
+            sock = create_listener()
+            break
+ 
     # Start a thread to periodically display metrics
     threading.Thread(target=display_metrics, daemon=True).start()
  
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
+            size, addr = sock.recvfrom_into(recv_buffer, RECV_BUFFER_SIZE)
             try:
-                message = json.loads(data.decode())
-                log_message("info", f"Received from {addr}: {message}")
+                message = decode_message(recv_view[:size])  # JSON from a satellite, or a binary frame
+                log_message("info", "Received from %s: %s", addr, message)
                 process_message(message, addr)
-            except json.JSONDecodeError:
-                handle_malformed_message(addr, data)
+            except (json.JSONDecodeError, KeyError):
+                handle_malformed_message(addr, bytes(recv_view[:size]))
         except Exception as e:
             log_message("error", f"Error in Command Station: {e}")
  
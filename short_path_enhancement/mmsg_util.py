@@ -0,0 +1 @@
+../Parallel_Enhancement/mmsg_util.py
\ No newline at end of file
@@ -1,11 +1,21 @@
 import socket
 import json
+import os
+import signal
 import time
-import random
 import threading
 import logging
+import logging.handlers
+import atexit
 import queue
 import sys
+import hashlib
+import heapq
+import itertools
+import selectors
+from frames import decode_message, format_timestamp, pack_ack
+from mmsg_util import recv_batch, send_batch
+from transport_util import PacketLoss, TokenBucket, claim_port
  
 # Configuration
 SATELLITE_PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 33001
@@ -14,13 +24,18 @@ COMMAND_STATION_IP = "10.35.70.19"  # Replace with actual Command Station IP
 COMMAND_STATION_PORT = 33500
 BROADCAST_INTERVAL = 5  # Interval between broadcast announcements (seconds)
 ACK_LISTEN_PORT = 33020  # Port for receiving ACKs
-MAX_CONNECTIONS = 5  # Max simultaneous connection handlers
 ISL_DELAY = 0.2  # Inter-Satellite Link delay (seconds)
 PACKET_LOSS_PROBABILITY = 0.1  # Simulated 10% chance of packet loss
 BANDWIDTH_LIMIT = 5000  # Bandwidth limit in bytes/second
 MAX_RETRIES = 3  # Max retries for packet forwarding
+SEND_BATCH_SIZE = 100  # Most queued datagrams handed to one sendmmsg call
+DUPLICATE_WINDOW = 10  # Seconds a message ID is remembered for duplicate detection
+BLOOM_FILTER_BITS = 1 << 23  # Bits in each generation of the duplicate filter (1 MiB)
+BLOOM_FILTER_HASHES = 7  # Bits set and tested per message ID
+RECEIVER_PROCESSES = 4  # Number of processes sharing SATELLITE_PORT
+SHUTDOWN_POLL_INTERVAL = 1  # Longest the receive loop waits before checking for shutdown (seconds)
  
-# Metrics
+# Metrics; display_metrics fills the counters in from the per-thread counters
 metrics = {
     "total_packets_received": 0,
     "total_packets_forwarded": 0,
@@ -30,14 +45,25 @@ metrics = {
     "duplicate_messages": 0,
     "shortest_path_updates": 0,
 }
-metrics_lock = threading.Lock()
+metrics_lock = threading.Lock()  # Guards counter registration and the aggregated metrics
  
-# Logging Configuration
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO,
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+# Each thread counts into its own dict, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+ 
+# Counters kept per thread: every metric but the average, plus the processing time total
+# that display_metrics divides by total_packets_received to get the average
+COUNTERS = [key for key in metrics if key != "average_processing_time"] + ["processing_time_ns"]
+ 
+# Logging Configuration; records go through a queue and a listener thread writes them,
+# so the receive loop and sender threads never wait on console I/O. Per-packet messages
+# are DEBUG so they cost a level check when disabled
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+logging.root.setLevel(logging.INFO)
  
 # Static Routing Table Fallback
 ROUTING_TABLE = {
@@ -50,21 +76,115 @@ ROUTING_TABLE = {
     "satellite": {"next_hop": "command_station"},
 }
  
-recent_messages = {}
-connection_queue = queue.Queue()
+def resolve_next_hops():
+    """Resolve each routing-table destination to the (ip, port) its messages are sent to."""
+    next_hops = {}
+    for destination, entry in ROUTING_TABLE.items():
+        # Fallback to next_hop if the direct entry is incomplete
+        if "ip" not in entry or "port" not in entry:
+            entry = ROUTING_TABLE.get(entry.get("next_hop"), {})
+        if "ip" in entry and "port" in entry:
+            next_hops[destination] = (entry["ip"], entry["port"])
+    return next_hops
+ 
+# Resolved next hops, rebuilt and swapped in whole whenever the routing table changes
+NEXT_HOPS = resolve_next_hops()
+ 
+# Shutdown flag, set by SIGINT or SIGTERM
+shutdown_flag = threading.Event()
+ 
+# Forwards are queued as (data, (ip, port)) and sent in batches by the sender thread;
+# None is queued at shutdown, behind every forward that still has to go out
+outbound_queue = queue.Queue()
+ 
+# Forwards waiting out the ISL delay, as (deadline, order, data, (ip, port))
+delayed_forwards = []
+delayed_forwards_ready = threading.Condition()
+delayed_forward_order = itertools.count()  # Tie-breaker so equal deadlines never compare messages
  
 # Utility Functions
+def signal_handler(sig, frame):
+    """Handles shutdown signals; the receive loop then stops and the threads drain."""
+    logging.info("Shutting down satellite node...")
+    shutdown_flag.set()
+ 
+class SlidingBloomFilter:
+    """Remember message IDs in fixed memory for between one and two windows.
+ 
+    IDs are added to the current generation and looked up in both. Once a window has
+    passed, the older generation is dropped and a cleared one becomes current. Lookups
+    can report a false positive but never miss an ID that is still remembered.
+    """
+ 
+    def __init__(self, bits, hashes, window):
+        self.bits = bits
+        self.hashes = hashes
+        self.window = window
+        self.current = bytearray(bits // 8)
+        self.previous = bytearray(bits // 8)
+        self.rotated = time.monotonic()
+        self.lock = threading.Lock()
+ 
+    def positions(self, key):
+        """Derive the bit positions for key from two 64-bit hashes (double hashing)."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+ 
+    def check_and_add(self, key):
+        """Return whether key was seen within the window, remembering it if not."""
+        positions = self.positions(key)
+        with self.lock:
+            now = time.monotonic()
+            if now - self.rotated >= self.window:
+                # After two idle windows the current generation is stale as well
+                if now - self.rotated >= 2 * self.window:
+                    self.current = bytearray(self.bits // 8)
+                self.previous, self.current = self.current, bytearray(self.bits // 8)
+                self.rotated = now
+            for generation in (self.current, self.previous):
+                if all(generation[p >> 3] & (1 << (p & 7)) for p in positions):
+                    return True
+            current = self.current
+            for p in positions:
+                current[p >> 3] |= 1 << (p & 7)
+            return False
+ 
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = dict.fromkeys(COUNTERS, 0)
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
+ 
+def update_metric(key, increment=1):
+    """Record a metric in the calling thread's counters."""
+    thread_counters()[key] += increment
+ 
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
+    with metrics_lock:
+        totals = {key: sum(counters[key] for counters in registered_counters) for key in COUNTERS}
+        processing_time_ns = totals.pop("processing_time_ns")
+        metrics.update(totals)
+        metrics["average_processing_time"] = processing_time_ns / max(metrics["total_packets_received"], 1) / 1e9
+        return dict(metrics)
+ 
+recent_messages = SlidingBloomFilter(BLOOM_FILTER_BITS, BLOOM_FILTER_HASHES, DUPLICATE_WINDOW)
+ 
+# IDs for the announcements this satellite originates. Neighbors check them for
+# duplicates, so the count starts from the start time in milliseconds and a restarted
+# satellite never reuses an ID they may still remember
+message_ids = itertools.count(time.time_ns() // 1000000)
+ 
 def is_duplicate(message_id):
     """Check if a message ID has already been processed."""
-    current_time = time.time()
-    if message_id in recent_messages:
-        if current_time - recent_messages[message_id] < 10:  # 10-second threshold
-            with metrics_lock:
-                metrics["duplicate_messages"] += 1
-            return True
-        else:
-            del recent_messages[message_id]
-    recent_messages[message_id] = current_time
+    if recent_messages.check_and_add(message_id):
+        update_metric("duplicate_messages")
+        return True
     return False
  
 def create_message(msg_type, source, destination, payload=None):
@@ -74,19 +194,17 @@ def create_message(msg_type, source, destination, payload=None):
         "source": source,
         "destination": destination,
         "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": f"{source}-{time.time_ns()}"
+        "timestamp": format_timestamp(int(time.time())),
+        "id": f"{source}-{next(message_ids)}"
     })
  
-def simulate_packet_loss():
-    """Simulate packet loss based on probability."""
-    return random.random() < PACKET_LOSS_PROBABILITY
+# Simulate packet loss based on probability
+simulate_packet_loss = PacketLoss(PACKET_LOSS_PROBABILITY)
  
-def simulate_bandwidth(data):
-    """Simulate bandwidth constraints."""
-    data_size = len(data.encode("utf-8"))  # Size in bytes
-    delay = data_size / BANDWIDTH_LIMIT  # Simulated delay
-    time.sleep(delay)
+# Shared by every sender in a process, and each receiver process paces its share, so the
+# limit holds for the satellite as a whole; simulate_bandwidth(data_size) paces data_size bytes
+bandwidth_bucket = TokenBucket(BANDWIDTH_LIMIT / RECEIVER_PROCESSES)
+simulate_bandwidth = bandwidth_bucket.consume
  
 # Satellite Functions
 def broadcast_presence():
@@ -94,147 +212,224 @@ def broadcast_presence():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     broadcast_address = "255.255.255.255"
-    while True:
+    while not shutdown_flag.is_set():
         try:
             message = create_message(
                 "announcement", f"satellite_{SATELLITE_PORT}", "all", {"port": SATELLITE_PORT}
             )
             if not simulate_packet_loss():
-                simulate_bandwidth(message)
+                simulate_bandwidth(len(message))
                 sock.sendto(message.encode(), (broadcast_address, BROADCAST_PORT))
-                logging.info(f"Broadcasted: {message}")
+                logging.info("Broadcasted: %s", message)
             else:
-                with metrics_lock:
-                    metrics["total_packets_dropped"] += 1
-                logging.warning(f"Packet dropped during broadcast: {message}")
-            time.sleep(BROADCAST_INTERVAL)
+                update_metric("total_packets_dropped")
+                logging.warning("Packet dropped during broadcast: %s", message)
+            shutdown_flag.wait(BROADCAST_INTERVAL)
         except Exception as e:
-            logging.error(f"Error broadcasting presence: {e}")
+            logging.error("Error broadcasting presence: %s", e)
  
 def send_ack(sock, addr, source):
     """Send acknowledgment to the sender."""
-    ack_message = create_message("ack", f"satellite_{SATELLITE_PORT}", source, {"status": "received"})
-    sock.sendto(ack_message.encode(), (addr[0], ACK_LISTEN_PORT))
-    with metrics_lock:
-        metrics["total_acks_sent"] += 1
-    logging.info(f"Sent ACK to source {source} at {addr[0]}:{ACK_LISTEN_PORT}")
+    ack_message = pack_ack(f"satellite_{SATELLITE_PORT}", source)
+    sock.sendto(ack_message, (addr[0], ACK_LISTEN_PORT))
+    update_metric("total_acks_sent")
+    logging.debug("Sent ACK to source %s at %s:%s", source, addr[0], ACK_LISTEN_PORT)
  
 def display_metrics():
     """Display metrics periodically."""
-    while True:
-        time.sleep(30)
-        with metrics_lock:
-            logging.info(f"Metrics for Satellite {SATELLITE_PORT}: {metrics}")
+    while not shutdown_flag.wait(30):
+        logging.info("Metrics for Satellite %s (process %s): %s", SATELLITE_PORT, os.getpid(), aggregate_metrics())
  
 def get_next_hop(destination):
-    """Determine the next hop for a given destination."""
-    if destination in ROUTING_TABLE:
-        entry = ROUTING_TABLE[destination]
-        if "ip" in entry and "port" in entry:
-            return entry  # Valid next hop with IP and port
-        # Fallback to next_hop if direct entry is incomplete
-        static_next_hop = entry.get("next_hop")
-        if static_next_hop and static_next_hop in ROUTING_TABLE:
-            next_hop_entry = ROUTING_TABLE[static_next_hop]
-            if "ip" in next_hop_entry and "port" in next_hop_entry:
-                return next_hop_entry
-    logging.error(f"No valid next hop for destination: {destination}. Current routing table: {ROUTING_TABLE}")
+    """Determine the (ip, port) of the next hop for a given destination."""
+    next_hop = NEXT_HOPS.get(destination)
+    if next_hop:
+        return next_hop
+    logging.error("No valid next hop for destination: %s. Current routing table: %s", destination, ROUTING_TABLE)
     return None
  
 def update_routing_table(message, addr):
     """Update the routing table based on announcements."""
-    source = message["source"]
-    payload = message["payload"]
+    global NEXT_HOPS
+    source = message.source
+    payload = message.payload
     if "port" in payload:
-        with metrics_lock:
-            # Add or update the routing table entry
-            ROUTING_TABLE[source] = {"ip": addr[0], "port": payload["port"]}
-            metrics["shortest_path_updates"] += 1
-        logging.info(f"Routing table updated: {ROUTING_TABLE}")
- 
-def forward_message(message):
-    """Forward message based on routing table."""
-    destination = message["destination"]
+        # Add or update the routing table entry
+        ROUTING_TABLE[source] = {"ip": addr[0], "port": payload["port"]}
+        NEXT_HOPS = resolve_next_hops()
+        update_metric("shortest_path_updates")
+        logging.info("Routing table updated: %s", ROUTING_TABLE)
+ 
+def forward_message(message, data):
+    """Forward message based on routing table, sending its bytes exactly as received."""
+    destination = message.destination
     next_hop = get_next_hop(destination)
     if next_hop:
-        forward_to_neighbor(json.dumps(message), next_hop["ip"], next_hop["port"])
+        forward_to_neighbor(data, next_hop)
     else:
-        logging.error(f"No route to destination {destination}. Routing table: {ROUTING_TABLE}")
-        with metrics_lock:
-            metrics["total_packets_dropped"] += 1
+        logging.error("No route to destination %s. Routing table: %s", destination, ROUTING_TABLE)
+        update_metric("total_packets_dropped")
  
-def forward_to_neighbor(data, ip, port):
-    """Forward message to a specific neighbor."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    for attempt in range(MAX_RETRIES):
+def forward_to_neighbor(data, address):
+    """Queue data for a specific neighbor at (ip, port); it is sent after the ISL delay."""
+    with delayed_forwards_ready:
+        heapq.heappush(delayed_forwards, (time.monotonic() + ISL_DELAY, next(delayed_forward_order), data, address))
+        delayed_forwards_ready.notify()
+    logging.debug("Queued data for neighbor at %s:%s", address[0], address[1])
+ 
+def delayed_forwarder():
+    """Hand each delayed forward to the sender once its ISL delay has elapsed."""
+    while True:
+        with delayed_forwards_ready:
+            while not shutdown_flag.is_set() and (not delayed_forwards or delayed_forwards[0][0] > time.monotonic()):
+                timeout = delayed_forwards[0][0] - time.monotonic() if delayed_forwards else None
+                delayed_forwards_ready.wait(timeout)
+            if shutdown_flag.is_set():
+                # Forwards still waiting out their delay go out now, then the sender stops
+                for _, _, data, address in sorted(delayed_forwards):
+                    outbound_queue.put((data, address))
+                delayed_forwards.clear()
+                outbound_queue.put(None)
+                return
+            _, _, data, address = heapq.heappop(delayed_forwards)
+        outbound_queue.put((data, address))
+ 
+def outbound_sender(sock):
+    """Send queued forwards on sock in batches, one sendmmsg call per batch, until None is queued."""
+    while True:
+        # Block for the first packet, then take whatever else is already waiting
+        batch = [outbound_queue.get()]
         try:
-            simulate_bandwidth(data)
-            time.sleep(ISL_DELAY)
-            sock.sendto(data.encode(), (ip, port))
-            logging.info(f"Forwarded to neighbor at {ip}:{port}")
-            with metrics_lock:
-                metrics["total_packets_forwarded"] += 1
+            while len(batch) < SEND_BATCH_SIZE and batch[-1] is not None:
+                batch.append(outbound_queue.get_nowait())
+        except queue.Empty:
+            pass
+        stopping = batch[-1] is None
+        if stopping:
+            batch.pop()
+ 
+        # Bandwidth is simulated once per batch instead of once per packet
+        if batch:
+            simulate_bandwidth(sum(len(data) for data, _ in batch))
+            for attempt in range(MAX_RETRIES):
+                try:
+                    send_batch(sock, batch)
+                    logging.debug("Forwarded a batch of %s packets.", len(batch))
+                    update_metric("total_packets_forwarded", len(batch))
+                    break
+                except Exception as e:
+                    logging.error("Retry %s: Error forwarding batch: %s", attempt + 1, e)
+                    time.sleep(0.5)
+            else:
+                update_metric("total_packets_dropped", len(batch))
+                logging.error("Failed to forward a batch of %s packets after retries.", len(batch))
+        if stopping:
             return
-        except Exception as e:
-            logging.error(f"Retry {attempt + 1}: Error forwarding to neighbor {ip}:{port}: {e}")
-            time.sleep(0.5)
-    with metrics_lock:
-        metrics["total_packets_dropped"] += 1
-    logging.error(f"Failed to forward to neighbor {ip}:{port} after retries.")
  
-def handle_connection(sock, addr, message):
+def handle_connection(sock, addr, data, message):
     """Handle an individual connection."""
     try:
-        start_time = time.time()
-        logging.info(f"Handling message: {message}")
-        if is_duplicate(message["id"]):
-            logging.warning(f"Duplicate message detected: {message['id']}")
+        start_time = time.perf_counter_ns()
+        logging.debug("Handling message: %s", message)
+        if is_duplicate(message.id):
+            logging.warning("Duplicate message detected: %s", message.id)
             return
-        if message["type"] == "data":
-            forward_message(message)
-            send_ack(sock, addr, message["source"])
-        elif message["type"] == "announcement":
+        if message.type == "data":
+            forward_message(message, data)
+            send_ack(sock, addr, message.source)
+        elif message.type == "announcement":
             update_routing_table(message, addr)
-        with metrics_lock:
-            processing_time = time.time() - start_time
-            metrics["total_packets_received"] += 1
-            metrics["average_processing_time"] = (
-                (metrics["average_processing_time"] + processing_time) / 2
-            )
+        counters = thread_counters()
+        counters["processing_time_ns"] += time.perf_counter_ns() - start_time
+        counters["total_packets_received"] += 1
     except Exception as e:
-        logging.error(f"Error handling connection: {e}")
+        logging.error("Error handling connection: %s", e)
  
-# Add to the existing main and worker logic
-def connection_worker(sock):
-    """Worker thread to handle queued connections."""
-    while True:
-        try:
-            addr, message = connection_queue.get()
-            handle_connection(sock, addr, message)
-            connection_queue.task_done()
-        except Exception as e:
-            logging.error(f"Error in connection worker: {e}")
+def create_listener():
+    """Create a UDP socket that shares SATELLITE_PORT with the other receiver processes."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", SATELLITE_PORT))
+    return sock
  
 def main():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    log_listener.start()
+    atexit.register(log_listener.stop)  # Flush queued records on exit
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
     try:
-        sock.bind(("", SATELLITE_PORT))
-        logging.info(f"Satellite {SATELLITE_PORT} listening on port {SATELLITE_PORT}.")
+        port_claim = claim_port(SATELLITE_PORT)  # SO_REUSEPORT alone would let a second satellite share the port
+        sock = create_listener()
+        logging.info("Satellite %s listening on port %s.", SATELLITE_PORT, SATELLITE_PORT)
     except OSError as e:
-        logging.error(f"Failed to bind to port {SATELLITE_PORT}: {e}")
+        logging.error("Failed to bind to port %s: %s", SATELLITE_PORT, e)
         sys.exit(1)
-    for _ in range(MAX_CONNECTIONS):
-        threading.Thread(target=connection_worker, args=(sock,), daemon=True).start()
-    threading.Thread(target=broadcast_presence, daemon=True).start()
+ 
+    # The kernel spreads datagrams across every socket bound with SO_REUSEPORT, so each
+    # forked process handles its share in parallel. Each flow always hashes to the same
+    # socket, so a vehicle's retransmissions reach the process that remembers their IDs.
+    # Forwards from every process leave through one shared socket, so a neighbor sees a
+    # single flow from this satellite and catches its duplicates the same way. A copy of a
+    # message arriving from a different sender can still land in another process and be
+    # forwarded again, since the duplicate filters are per process. Routing tables are per
+    # process too; announcements only go to BROADCAST_PORT today, so every process routes
+    # from the same static table, but a route learned over SATELLITE_PORT would reach one
+    # process only.
+    # Threads do not survive a fork, so the log listener is restarted in every process
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    log_listener.stop()
+    children = []
+    for _ in range(RECEIVER_PROCESSES - 1):
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            sock = create_listener()
+            children = None
+            break
+        children.append(pid)
+    parent = children is not None
+    log_listener.start()
+ 
+    sender = threading.Thread(target=outbound_sender, args=(send_sock,), daemon=True)
+    sender.start()
+    forwarder = threading.Thread(target=delayed_forwarder, daemon=True)
+    forwarder.start()
+    if parent:
+        threading.Thread(target=broadcast_presence, daemon=True).start()  # One announcer per satellite
     threading.Thread(target=display_metrics, daemon=True).start()
-    while True:
+    # Handling a message only queues its forward and sends an ACK, so each datagram is
+    # handled right here; every wakeup drains up to a full batch with one recvmmsg call
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    while not shutdown_flag.is_set():
+        if not sel.select(SHUTDOWN_POLL_INTERVAL):
+            continue
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data.decode())
-            logging.info(f"Received data from {addr}: {message}")
-            connection_queue.put((addr, message))
+            packets = recv_batch(sock)
         except Exception as e:
-            logging.error(f"Error on Satellite Node {SATELLITE_PORT}: {e}") 
+            logging.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+            continue
+        for data, addr in packets:
+            try:
+                message = decode_message(data)  # Binary data frame from a vehicle, or JSON
+                logging.debug("Received data from %s: %s", addr, message)
+                handle_connection(sock, addr, data, message)
+            except Exception as e:
+                logging.error("Error on Satellite Node %s: %s", SATELLITE_PORT, e)
+ 
+    # Nothing new is received now; send what is still queued, then report the final metrics
+    sock.close()
+    with delayed_forwards_ready:
+        delayed_forwards_ready.notify()
+    forwarder.join()
+    sender.join()
+    logging.info("Final metrics for Satellite %s (process %s): %s", SATELLITE_PORT, os.getpid(), aggregate_metrics())
+    if parent:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            os.waitpid(pid, 0)
+ 
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,64 @@
+import random
+import socket
+import threading
+import time
+
+# Link simulation and port handling shared by the short-path nodes and, through a symlink,
+# the scalable satellite. Each script keeps its own loss probability and bandwidth limit
+# and binds these helpers to them.
+
+LOSS_BATCH_SIZE = 1024  # Packet-loss decisions drawn per batch
+
+
+class PacketLoss:
+    """Decide whether simulated packets are lost, drawing the decisions in batches."""
+
+    def __init__(self, probability):
+        self.probability = probability
+        self.decisions = iter(())
+
+    def __call__(self):
+        """Return whether the next packet is lost."""
+        try:
+            return next(self.decisions)
+        except StopIteration:
+            self.decisions = iter([random.random() < self.probability for _ in range(LOSS_BATCH_SIZE)])
+            return next(self.decisions)
+
+
+class TokenBucket:
+    """Pace traffic to a byte rate, letting up to one second's worth through at once."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """Take amount bytes' worth of tokens, waiting only while the bucket is overdrawn."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def claim_port(port):
+    """Claim port for this process and its children, raising OSError if another process holds it.
+
+    Every receiver socket sets SO_REUSEPORT, so a second node started on the same port
+    would bind too and silently take half the traffic. The claim is an abstract Unix
+    socket named after the port, which the kernel releases when the last holder exits.
+    The caller keeps the returned socket open for as long as it serves the port.
+    """
+    claim = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        claim.bind(f"\0trustlink-udp-{port}")
+    except OSError:
+        claim.close()
+        raise
+    return claim
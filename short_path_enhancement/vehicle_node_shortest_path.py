@@ -6,6 +6,8 @@ import threading
 import logging
 import signal
 import sys
+from frames import decode_message, pack_data
+from transport_util import PacketLoss, TokenBucket
 
 # Configuration
 BROADCAST_PORT = 34000
@@ -17,6 +19,7 @@ ACK_TIMEOUT = 2
 SATELLITE_REDISCOVERY_INTERVAL = 60
 PACKET_LOSS_PROBABILITY = 0.05  # Reduced for debugging
 BANDWIDTH_LIMIT = 5000
+RECV_BUFFER_SIZE = 65536  # Reused receive buffers, large enough for any UDP datagram
 
 # Metrics tracking
 metrics = {
@@ -28,12 +31,30 @@ metrics = {
     "discovered_satellites": 0,
 }
 
-# Thread-safe lock for metrics
+# Guards counter registration and the aggregated metrics
 metrics_lock = threading.Lock()
 
+# Each thread counts into its own dict, so recording a metric takes no lock
+thread_metrics = threading.local()
+registered_counters = []
+
+# Counters kept per thread: every metric but the average and the satellite count set by
+# discovery, plus the response time total that display_metrics divides by the successes
+COUNTERS = [key for key in metrics if key not in ("average_response_time", "discovered_satellites")] + ["response_time_ns"]
+
 # Shutdown flag
 shutdown_flag = threading.Event()
 
+# Datagrams are received into preallocated buffers instead of a new bytes object each;
+# discovery and ACKs each have their own, as they are read on different threads
+discovery_buffer = bytearray(RECV_BUFFER_SIZE)
+discovery_view = memoryview(discovery_buffer)
+ack_buffer = bytearray(RECV_BUFFER_SIZE)
+ack_view = memoryview(ack_buffer)
+
+# Satellites to pick from, rebuilt only when discovery changes the satellite list
+satellite_choices = ()
+
 # Logging Configuration
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -48,65 +69,86 @@ def signal_handler(sig, frame):
     shutdown_flag.set()
     sys.exit(0)
 
-def create_message(msg_type, source, destination, payload=None):
-    """Create a formatted message."""
-    return json.dumps({
-        "type": msg_type,
-        "source": source,
-        "destination": destination,
-        "payload": payload,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "id": "%s-%d" % (source, int(time.time() * 1000000))
-    })
+def thread_counters():
+    """Return the calling thread's metric counters, registering them on first use."""
+    counters = getattr(thread_metrics, "counters", None)
+    if counters is None:
+        counters = thread_metrics.counters = dict.fromkeys(COUNTERS, 0)
+        with metrics_lock:
+            registered_counters.append(counters)
+    return counters
 
 
-def simulate_packet_loss():
-    """Simulate packet loss based on probability."""
-    return random.random() < PACKET_LOSS_PROBABILITY
+def update_metric(key, increment=1):
+    """Record a metric in the calling thread's counters."""
+    thread_counters()[key] += increment
 
 
-def simulate_bandwidth(data):
-    """Simulate bandwidth constraints."""
-    data_size = len(data.encode("utf-8"))
-    delay = float(data_size) / BANDWIDTH_LIMIT
-    time.sleep(delay)
+def aggregate_metrics():
+    """Sum every thread's counters into metrics and return a copy."""
+    with metrics_lock:
+        totals = {key: sum(counters[key] for counters in registered_counters) for key in COUNTERS}
+        response_time_ns = totals.pop("response_time_ns")
+        metrics.update(totals)
+        metrics["average_response_time"] = response_time_ns / max(metrics["successful_transmissions"], 1) / 1e9
+        return dict(metrics)
 
 
-def discover_satellites():
-    """Discover satellites via broadcast."""
-    discovered = {}
+def create_data_message(vehicle_id, gps_data):
+    """Create a GPS data message as a binary frame."""
+    return pack_data(vehicle_id, gps_data["latitude"], gps_data["longitude"], int(time.time() * 1000000))
+
+
+# Simulate packet loss based on probability
+simulate_packet_loss = PacketLoss(PACKET_LOSS_PROBABILITY)
+
+# simulate_bandwidth(data_size) paces data_size bytes
+bandwidth_bucket = TokenBucket(BANDWIDTH_LIMIT)
+simulate_bandwidth = bandwidth_bucket.consume
+
+
+def open_discovery_socket():
+    """Open the socket satellite announcements are received on."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     sock.bind(("", BROADCAST_PORT))
     sock.settimeout(1)
+    return sock
+
+
+def discover_satellites(sock):
+    """Discover satellites via broadcast."""
+    discovered = {}
     logging.info("Listening for satellite broadcasts...")
 
     start_time = time.time()
-    with metrics_lock:
-        metrics["discovered_satellites"] = 0
-
     while time.time() - start_time < SATELLITE_DISCOVERY_TIMEOUT:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = json.loads(data)
+            size, addr = sock.recvfrom_into(discovery_buffer, RECV_BUFFER_SIZE)
+            message = json.loads(str(discovery_view[:size], "utf-8"))
             if message.get("type") == "announcement" and "port" in message["payload"]:
                 discovered[message["source"]] = {"ip": addr[0], "port": message["payload"]["port"]}
                 logging.info("Discovered Satellite %s on IP %s Port %s" % (
                     message["source"], addr[0], message["payload"]["port"]))
-                with metrics_lock:
-                    metrics["discovered_satellites"] += 1
         except socket.timeout:
             continue
         except Exception as e:
             logging.error("Error during satellite discovery: %s" % e)
-    sock.close()
+    with metrics_lock:
+        metrics["discovered_satellites"] = len(discovered)
     return discovered
-def select_best_satellite(satellites):
+def refresh_satellite_choices(satellites):
+    """Rebuild the tuple select_best_satellite picks from."""
+    global satellite_choices
+    satellite_choices = tuple(satellites.values())
+
+
+def select_best_satellite():
     """Select the best satellite based on random or specific criteria."""
-    if not satellites:
+    if not satellite_choices:
         logging.error("No satellites available for selection.")
         return None
-    selected = random.choice(list(satellites.values()))
+    selected = random.choice(satellite_choices)
     logging.info("Selected Satellite IP: %s, Port: %s" % (selected["ip"], selected["port"]))
     return selected
 
@@ -119,36 +161,30 @@ def send_data(sock, satellite_ip, satellite_port, message):
                 logging.warning("Simulated packet loss during transmission to %s:%s." % (satellite_ip, satellite_port))
                 continue
 
-            start_time = time.time()
-            simulate_bandwidth(message)
-            sock.sendto(message.encode("utf-8"), (satellite_ip, satellite_port))
+            start_time = time.perf_counter_ns()
+            simulate_bandwidth(len(message))
+            sock.sendto(message, (satellite_ip, satellite_port))
             logging.info("Sent data to %s:%s: %s" % (satellite_ip, satellite_port, message))
-            with metrics_lock:
-                metrics["total_messages_sent"] += 1
+            update_metric("total_messages_sent")
 
             sock.settimeout(ACK_TIMEOUT)
-            ack, addr = sock.recvfrom(1024)
-            ack_message = json.loads(ack)
-
-            if ack_message.get("type") == "ack":
-                response_time = time.time() - start_time
-                with metrics_lock:
-                    metrics["successful_transmissions"] += 1
-                    metrics["average_response_time"] = (
-                        (metrics["average_response_time"] + response_time) / 2
-                    )
-                logging.info("ACK received from Satellite %s." % ack_message["source"])
+            size, addr = sock.recvfrom_into(ack_buffer, RECV_BUFFER_SIZE)
+            ack_message = decode_message(ack_view[:size])
+
+            if ack_message.type == "ack":
+                counters = thread_counters()
+                counters["response_time_ns"] += time.perf_counter_ns() - start_time
+                counters["successful_transmissions"] += 1
+                logging.info("ACK received from Satellite %s." % ack_message.source)
                 return True
         except socket.timeout:
             logging.warning("No ACK received from %s:%s, attempt %d/%d." % (
                 satellite_ip, satellite_port, attempt + 1, MAX_RETRIES))
-            with metrics_lock:
-                metrics["retransmissions"] += 1
+            update_metric("retransmissions")
         except Exception as e:
             logging.error("Error during ACK handling: %s" % e)
 
-    with metrics_lock:
-        metrics["failed_transmissions"] += 1
+    update_metric("failed_transmissions")
     return False
 def generate_gps_data():
     """Generate random GPS data."""
@@ -165,13 +201,14 @@ def generate_vehicle_id():
     return vehicle_id
 
 
-def rediscover_satellites(satellites):
+def rediscover_satellites(discovery_sock, satellites):
     """Periodically rediscover satellites."""
     while not shutdown_flag.is_set():
         time.sleep(SATELLITE_REDISCOVERY_INTERVAL)
         logging.info("Rediscovering satellites...")
-        new_satellites = discover_satellites()
+        new_satellites = discover_satellites(discovery_sock)
         satellites.update(new_satellites)
+        refresh_satellite_choices(satellites)
         logging.info("Updated Satellite List: %s" % satellites)
 
 
@@ -179,19 +216,22 @@ def display_metrics():
     """Display metrics periodically."""
     while not shutdown_flag.is_set():
         time.sleep(30)
-        with metrics_lock:
-            logging.info("Metrics: %s" % metrics)
+        logging.info("Metrics: %s" % aggregate_metrics())
 def main():
     """Main vehicle node function."""
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    satellites = discover_satellites()
+    # One discovery socket is kept open and reused by every rediscovery
+    discovery_sock = open_discovery_socket()
+    satellites = discover_satellites(discovery_sock)
     if not satellites:
         logging.error("No satellites discovered. Exiting...")
+        discovery_sock.close()
         return
+    refresh_satellite_choices(satellites)
 
-    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(satellites,))
+    rediscovery_thread = threading.Thread(target=rediscover_satellites, args=(discovery_sock, satellites))
     rediscovery_thread.setDaemon(True)
     rediscovery_thread.start()
 
@@ -207,9 +247,9 @@ def main():
         while not shutdown_flag.is_set():
             vehicle_id = generate_vehicle_id()
             gps_data = generate_gps_data()
-            message = create_message("data", vehicle_id, "satellite", {"gps": gps_data})
+            message = create_data_message(vehicle_id, gps_data)
 
-            selected_satellite = select_best_satellite(satellites)
+            selected_satellite = select_best_satellite()
             if selected_satellite:
                 success = send_data(sock, selected_satellite["ip"], selected_satellite["port"], message)
                 if success: